@@ -0,0 +1,254 @@
+# monitor_service/job_index.py
+"""
+SQLite index of processing jobs, one row per output folder.
+
+The monitor writes to it as files move through the pipeline; the web UI reads it (read-only)
+to serve paginated, searchable lookups without listing and opening output folders.
+"""
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DB_FILE_NAME = "jobs.db"
+
+# Job status values stored in the 'status' column
+STATUS_PROCESSING = "processing"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_ERROR = "error"
+STATUS_LEGACY = "legacy" # Backfilled from a folder written before the index existed
+STATUS_SPLIT = "split" # Page holding several recipes; each has its own job, <job_id>_r<n>
+
+ARCHIVE_PREFIXES = ("SUCCESS_", "FAILED_") # Added to source file names by file_manager.move_to_archive
+
+# Columns update_job() may set. Anything else is rejected so callers can't inject SQL via keyword names.
+UPDATABLE_COLUMNS = (
+    "recipe_name", "status", "message", "finished_at",
+    "ocr_seconds", "llm_seconds", "post_process_seconds", "send_seconds", "total_seconds",
+    "artifacts", "token_usage",
+)
+
+# Columns added after the first release, created on existing databases by init_db()
+MIGRATED_COLUMNS = {
+    "token_usage": "TEXT", # JSON: tokens per purpose (generation / repair / regeneration)
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    source_file TEXT NOT NULL,
+    source_hash TEXT,
+    recipe_name TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    ocr_seconds REAL,
+    llm_seconds REAL,
+    post_process_seconds REAL,
+    send_seconds REAL,
+    total_seconds REAL,
+    output_dir TEXT NOT NULL,
+    artifacts TEXT,
+    token_usage TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_source_file ON jobs (source_file);
+CREATE INDEX IF NOT EXISTS idx_jobs_source_hash ON jobs (source_hash);
+CREATE INDEX IF NOT EXISTS idx_jobs_recipe_name ON jobs (recipe_name);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+"""
+
+# Full-text index over source file and recipe name, so the web UI's search doesn't scan the table with LIKE '%q%'.
+# External-content FTS5 table kept in sync with jobs by triggers.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(source_file, recipe_name, content='jobs', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+    INSERT INTO jobs_fts (rowid, source_file, recipe_name) VALUES (new.id, new.source_file, new.recipe_name);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+    INSERT INTO jobs_fts (jobs_fts, rowid, source_file, recipe_name) VALUES ('delete', old.id, old.source_file, old.recipe_name);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE OF source_file, recipe_name ON jobs BEGIN
+    INSERT INTO jobs_fts (jobs_fts, rowid, source_file, recipe_name) VALUES ('delete', old.id, old.source_file, old.recipe_name);
+    INSERT INTO jobs_fts (rowid, source_file, recipe_name) VALUES (new.id, new.source_file, new.recipe_name);
+END;
+"""
+
+
+def _connect(db_path):
+    # A generous busy timeout: the monitor and web UI may touch the file at the same time
+    return sqlite3.connect(db_path, timeout=30)
+
+
+def init_db(db_path):
+    """Creates the jobs table, its indexes and the full-text index if they don't exist yet, and adds any newer columns."""
+    conn = _connect(db_path)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in MIGRATED_COLUMNS.items():
+                if column not in existing_columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'").fetchone()
+            conn.executescript(FTS_SCHEMA)
+            if not has_fts:
+                # Databases created before the full-text index: index the rows already there
+                conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('rebuild')")
+        logger.info(f"Job index ready at {db_path}")
+    finally:
+        conn.close()
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 of a file, read in chunks so large scans aren't loaded into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def start_job(db_path, job_id, source_file, source_hash, output_dir):
+    """Records a new job in the 'processing' state. Errors are logged, never raised, so indexing can't break processing."""
+    try:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, source_file, source_hash, status, created_at, output_dir) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, source_file, source_hash, STATUS_PROCESSING, datetime.now().isoformat(timespec="seconds"), output_dir)
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to record job '{job_id}' in index {db_path}: {e}")
+
+
+def update_job(db_path, job_id, **fields):
+    """
+    Updates columns of an existing job. 'artifacts' and 'token_usage' may be given as dicts and are stored as JSON.
+    Database errors are logged, never raised; an unknown column name is a programming error and raises ValueError.
+    """
+    unknown = set(fields) - set(UPDATABLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown job index column(s): {', '.join(sorted(unknown))}")
+    if not fields:
+        return
+    for json_column in ("artifacts", "token_usage"):
+        if isinstance(fields.get(json_column), dict):
+            fields[json_column] = json.dumps(fields[json_column])
+
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    try:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to update job '{job_id}' in index {db_path}: {e}")
+
+
+def get_job(db_path, job_id):
+    """Returns a job's row as a dict (JSON columns decoded), or None if it isn't indexed or the index can't be read."""
+    try:
+        conn = _connect(db_path)
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read job '{job_id}' from index {db_path}: {e}")
+        return None
+    if row is None:
+        return None
+    job = dict(row)
+    for json_column in ("artifacts", "token_usage"):
+        job[json_column] = json.loads(job[json_column]) if job[json_column] else {}
+    return job
+
+
+def _archived_sources(archive_dir):
+    """
+    Maps source file names without extension to the archived source files, so backfilled rows get the same
+    source_file (extension included) and source_hash as live ones. The raw OCR file name drops the extension.
+    """
+    sources = {}
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return sources
+    for entry in sorted(os.scandir(archive_dir), key=lambda e: e.name):
+        for prefix in ARCHIVE_PREFIXES:
+            if entry.is_file() and entry.name.startswith(prefix):
+                file_name = entry.name[len(prefix):]
+                sources.setdefault(os.path.splitext(file_name)[0], (file_name, entry.path))
+    return sources
+
+
+def backfill(db_path, output_dir, archive_dir=None):
+    """
+    Indexes output folders written before the job index existed. Folders already in the index are left alone.
+    Source files still in archive_dir give the rows their full file name and hash; otherwise only the name
+    without extension is known. Returns the number of folders added.
+    """
+    # Imported here so the web UI-facing helpers above don't pull in the pipeline
+    import pipeline
+    import file_manager
+
+    init_db(db_path)
+    archived_sources = _archived_sources(archive_dir)
+    added = 0
+    conn = _connect(db_path)
+    try:
+        known = {row[0] for row in conn.execute("SELECT job_id FROM jobs")}
+        for entry in sorted(os.scandir(output_dir), key=lambda e: e.name):
+            if not entry.is_dir() or entry.name in known:
+                continue
+            raw_text_path = pipeline.find_raw_text_file(entry.path)
+            if not raw_text_path:
+                continue
+
+            artifacts = {"raw_ocr": raw_text_path}
+            recipe_name = None
+            for key, artifact in (("create_recipe", pipeline.CREATE_RECIPE_FILE), ("processed_recipe", pipeline.PROCESSED_RECIPE_FILE),
+                                  ("schema_org", pipeline.SCHEMA_ORG_FILE)):
+                artifact_path = os.path.join(entry.path, artifact)
+                if os.path.exists(artifact_path):
+                    artifacts[key] = artifact_path
+                    recipe_name = recipe_name or (file_manager.load_json_file(artifact_path) or {}).get("name")
+
+            source_file = os.path.basename(raw_text_path)[:-len(pipeline.RAW_OCR_SUFFIX)]
+            source_hash = None
+            if source_file in archived_sources:
+                source_file, archived_path = archived_sources[source_file]
+                source_hash = file_sha256(archived_path)
+
+            created_at = datetime.fromtimestamp(entry.stat().st_mtime).isoformat(timespec="seconds")
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, source_file, source_hash, recipe_name, status, created_at, output_dir, artifacts) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry.name, source_file, source_hash, recipe_name, STATUS_LEGACY, created_at, entry.path, json.dumps(artifacts))
+                )
+            added += 1
+    finally:
+        conn.close()
+    logger.info(f"Backfilled {added} output folder(s) into {db_path}")
+    return added
+
+
+if __name__ == "__main__":
+    # Usage: python job_index.py [output_dir] [archive_dir]  -- index folders created before the job index existed
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else "/app/output"
+    source_archive_dir = sys.argv[2] if len(sys.argv) > 2 else "/app/archive"
+    backfill(os.path.join(target_dir, DB_FILE_NAME), target_dir, source_archive_dir)
@@ -0,0 +1,231 @@
+# monitor_service/json_stream.py
+"""
+Incremental JSON parser for streamed LLM responses.
+
+Text is fed in chunks as the model generates it. The parser validates JSON syntax character by
+character, so a malformed reply is detected as soon as the first bad character arrives instead of
+after the whole response, and hands each top-level field to a callback as soon as its value is complete.
+"""
+import re
+import json
+import string
+
+_WHITESPACE = " \t\r\n"
+_LITERALS = ("true", "false", "null")
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?\Z")
+_ESCAPE_CHARS = frozenset('"\\/bfnrt')
+_HEX_DIGITS = frozenset(string.hexdigits)
+_FENCE_LINES = ("```", "```json")
+
+# Container states
+_KEY_OR_END = "key_or_end"     # after '{'
+_KEY = "key"                   # after ',' in an object
+_COLON = "colon"
+_VALUE_OR_END = "value_or_end" # after '['
+_VALUE = "value"               # after ':' or ',' in an array
+_COMMA_OR_END = "comma_or_end"
+
+
+class JSONStreamError(ValueError):
+    """Raised as soon as streamed text can no longer become the expected JSON object."""
+
+
+class IncrementalJSONParser:
+    """
+    Validates a single JSON object as it streams in.
+
+    Args:
+        field_validator (callable, optional): Called as field_validator(key, value) for every completed
+            top-level field; raise JSONStreamError from it to reject off-schema output.
+        on_field (callable, optional): Called as on_field(key, value) once a top-level field has passed validation.
+
+    A leading Markdown code fence (```json) is accepted and anything after the closing brace is ignored.
+    """
+
+    def __init__(self, field_validator=None, on_field=None):
+        self.field_validator = field_validator
+        self.on_field = on_field
+        self.complete = False
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._object_start = None
+        self._object_end = None
+        self._stack = [] # [kind, state] per open container
+        self._in_string = False
+        self._string_is_key = False
+        self._string_start = None
+        self._escape = False
+        self._unicode_left = 0
+        self._scalar = None
+        self._field_key = None
+        self._field_start = None
+
+    def feed(self, chunk):
+        """Consumes the next chunk of text. Returns True once the top-level object is complete."""
+        if self.complete:
+            return True
+        self._text += chunk
+        if not self._started and not self._skip_preamble():
+            return False
+
+        text = self._text
+        while self._pos < len(text) and not self.complete:
+            self._step(text[self._pos], self._pos)
+            self._pos += 1
+        return self.complete
+
+    def finish(self):
+        """Returns the parsed object. Raises JSONStreamError if the stream ended before it was complete."""
+        if not self.complete:
+            raise JSONStreamError("Response ended before the JSON object was complete")
+        return json.loads(self._text[self._object_start:self._object_end])
+
+    def _skip_preamble(self):
+        """Skips whitespace and an optional opening code fence. Returns True once the opening '{' is found."""
+        text = self._text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if ch in _WHITESPACE:
+                self._pos += 1
+            elif ch == "`":
+                line_end = text.find("\n", self._pos)
+                if line_end == -1:
+                    # Wait for the rest of the fence line, but don't buffer an arbitrary amount of prose
+                    if not any(fence.startswith(text[self._pos:].strip().lower()) for fence in _FENCE_LINES):
+                        raise JSONStreamError(f"Unexpected preamble before JSON object: {text[self._pos:][:40]!r}")
+                    return False
+                if text[self._pos:line_end].strip().lower() not in _FENCE_LINES:
+                    raise JSONStreamError(f"Unexpected preamble before JSON object: {text[self._pos:line_end][:40]!r}")
+                self._pos = line_end + 1
+            elif ch == "{":
+                self._started = True
+                self._object_start = self._pos
+                return True
+            else:
+                raise JSONStreamError(f"Response does not start with a JSON object (got {ch!r})")
+        return False
+
+    def _step(self, ch, pos):
+        if self._in_string:
+            self._step_string(ch, pos)
+            return
+
+        if self._scalar is not None:
+            if ch in _NUMBER_CHARS or ch.isalpha():
+                self._scalar += ch
+                self._check_scalar_prefix()
+                return
+            self._finish_scalar(pos)
+
+        if ch in _WHITESPACE:
+            return
+
+        if not self._stack:
+            if ch != "{":
+                raise JSONStreamError(f"Expected '{{' at position {pos}, got {ch!r}")
+            self._stack.append(["object", _KEY_OR_END])
+            return
+
+        frame = self._stack[-1]
+        kind, state = frame
+        if state in (_KEY_OR_END, _KEY):
+            if ch == '"':
+                self._start_string(pos, is_key=True)
+            elif ch == "}" and state == _KEY_OR_END:
+                self._close_container(pos)
+            else:
+                raise JSONStreamError(f"Expected an object key at position {pos}, got {ch!r}")
+        elif state == _COLON:
+            if ch != ":":
+                raise JSONStreamError(f"Expected ':' at position {pos}, got {ch!r}")
+            frame[1] = _VALUE
+        elif state in (_VALUE, _VALUE_OR_END):
+            if ch == "]" and state == _VALUE_OR_END:
+                self._close_container(pos)
+            else:
+                self._start_value(ch, pos)
+        elif state == _COMMA_OR_END:
+            if ch == ",":
+                frame[1] = _KEY if kind == "object" else _VALUE
+            elif ch == ("}" if kind == "object" else "]"):
+                self._close_container(pos)
+            else:
+                raise JSONStreamError(f"Expected ',' or end of {kind} at position {pos}, got {ch!r}")
+
+    def _start_value(self, ch, pos):
+        if len(self._stack) == 1:
+            self._field_start = pos
+        if ch == "{":
+            self._stack.append(["object", _KEY_OR_END])
+        elif ch == "[":
+            self._stack.append(["array", _VALUE_OR_END])
+        elif ch == '"':
+            self._start_string(pos, is_key=False)
+        elif ch == "-" or ch.isdigit() or ch in "tfn":
+            self._scalar = ch
+        else:
+            raise JSONStreamError(f"Unexpected character {ch!r} at position {pos}")
+
+    def _start_string(self, pos, is_key):
+        self._in_string = True
+        self._string_is_key = is_key
+        self._string_start = pos
+
+    def _step_string(self, ch, pos):
+        if self._unicode_left:
+            if ch not in _HEX_DIGITS:
+                raise JSONStreamError(f"Invalid \\u escape at position {pos}")
+            self._unicode_left -= 1
+        elif self._escape:
+            self._escape = False
+            if ch == "u":
+                self._unicode_left = 4
+            elif ch not in _ESCAPE_CHARS:
+                raise JSONStreamError(f"Invalid escape '\\{ch}' at position {pos}")
+        elif ch == "\\":
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                if len(self._stack) == 1:
+                    self._field_key = json.loads(self._text[self._string_start:pos + 1])
+                self._stack[-1][1] = _COLON
+            else:
+                self._value_done(pos + 1)
+        elif ord(ch) < 0x20:
+            raise JSONStreamError(f"Unescaped control character in string at position {pos}")
+
+    def _check_scalar_prefix(self):
+        if self._scalar[0].isalpha():
+            if not any(literal.startswith(self._scalar) for literal in _LITERALS):
+                raise JSONStreamError(f"Invalid literal {self._scalar!r}")
+        elif not _NUMBER_CHARS.issuperset(self._scalar):
+            raise JSONStreamError(f"Invalid number {self._scalar!r}")
+
+    def _finish_scalar(self, end):
+        scalar = self._scalar
+        self._scalar = None
+        if scalar not in _LITERALS and not _NUMBER_RE.match(scalar):
+            raise JSONStreamError(f"Invalid value {scalar!r}")
+        self._value_done(end)
+
+    def _close_container(self, pos):
+        self._stack.pop()
+        if not self._stack:
+            self._object_end = pos + 1
+            self.complete = True
+        else:
+            self._value_done(pos + 1)
+
+    def _value_done(self, end):
+        self._stack[-1][1] = _COMMA_OR_END
+        if len(self._stack) == 1:
+            self._emit_field(self._field_key, json.loads(self._text[self._field_start:end]))
+
+    def _emit_field(self, key, value):
+        if self.field_validator:
+            self.field_validator(key, value)
+        if self.on_field:
+            self.on_field(key, value)
@@ -1,12 +1,24 @@
-import google.generativeai as genai
 import os
 import json
 import logging
+import threading
+
+import recipe_schemas
+from json_stream import IncrementalJSONParser, JSONStreamError
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GEMINI_MODEL = 'gemini-1.5-flash-latest'
+
+# google-generativeai is imported and configured on first use (or by warm_up()) so it doesn't slow down monitor startup
+_genai = None
+_genai_lock = threading.Lock()
+
+# Token accounting, split by why the call was made: first attempt, targeted repair, or full regeneration
+# after a failed repair. Totals cover the life of the process; callers can also pass a per-job usage dict.
+TOKEN_PURPOSES = ("generation", "repair", "regeneration")
+_token_totals = {purpose: 0 for purpose in TOKEN_PURPOSES}
+_token_lock = threading.Lock()
 
 # --- PROMPT FOR SCHEMA.ORG JSON ---
 SCHEMA_ORG_LLM_PROMPT_TEMPLATE = """
@@ -80,66 +92,182 @@ Your task is to accurately parse ONLY this provided text and generate a VALID JS
 **Output ONLY the JSON object. Do NOT include any other text, explanations, or markdown outside the JSON block.**
 """
 
-def get_schema_org_json(raw_text):
+# --- PROMPT FOR TARGETED SCHEMA REPAIR ---
+REPAIR_LLM_PROMPT_TEMPLATE = """
+You previously generated {label} recipe JSON that failed schema validation.
+Below are ONLY the failing locations: each has a JSON Pointer `path`, the `current_value` at that path (absent if the field is missing) and the validation `error`.
+
+**--- START OF VALIDATION FAILURES ---**
+{failures}
+**--- END OF VALIDATION FAILURES ---**
+
+Fix each failure using only information already present in the current values. Do NOT invent recipe details.
+Return a JSON object whose keys are JSON Pointer paths and whose values are the corrected values for those paths.
+To add a missing required field, use the path of the field itself (e.g. "/steps/2/name"). Use `null` to remove a field.
+
+**Output ONLY the JSON object. Do NOT include any other text, explanations, or markdown outside the JSON block.**
+"""
+
+def _validate_schema_org_field(key, value):
+    """
+    Aborts a Schema.org response that isn't a Recipe at all. Wrong field types are not checked here: they are
+    left to schema validation and targeted repair (or post-processing), which can fix them without regenerating.
+    """
+    if key == "@type" and value != "Recipe":
+        raise JSONStreamError(f"Schema.org '@type' is {value!r}, expected 'Recipe'")
+
+
+def _log_field_progress(label):
+    """Builds an on_field callback that logs generation progress as top-level fields stream in."""
+    def log_progress(key, value):
+        if key == "name":
+            logger.info(f"LLM is generating {label} JSON for '{value}'...")
+        elif key in ("steps", "recipeInstructions") and isinstance(value, list):
+            logger.info(f"LLM streamed {len(value)} step(s) of {label} JSON.")
+    return log_progress
+
+
+def _get_genai():
+    """Imports and configures the Gemini SDK once; later calls return the cached module."""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+
+                # Configure Gemini API
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _genai = genai
+    return _genai
+
+
+def warm_up():
+    """Loads the Gemini SDK ahead of the first file."""
+    _get_genai()
+
+
+def _record_token_usage(purpose, label, usage_metadata, usage=None):
+    """Adds a call's token count to the process totals and, if given, the caller's per-job usage dict."""
+    tokens = getattr(usage_metadata, "total_token_count", 0) or 0
+    with _token_lock:
+        _token_totals[purpose] += tokens
+    if usage is not None:
+        usage[purpose] = usage.get(purpose, 0) + tokens
+    logger.info(f"LLM {purpose} for {label} used {tokens} tokens.")
+    return tokens
+
+
+def get_token_totals():
+    """Returns a copy of the tokens spent per purpose since the process started."""
+    with _token_lock:
+        return dict(_token_totals)
+
+
+def _generate_json(prompt, label, field_validator=None, on_field=None, purpose="generation", usage=None):
+    """
+    Streams a Gemini response through the incremental JSON parser.
+
+    Generation is abandoned as soon as the output is malformed or field_validator rejects a field. Once the JSON object is
+    complete the remaining chunks are only drained for token usage. Each top-level field is passed to
+    on_field(key, value) as soon as it is parsed.
+    """
+    model = _get_genai().GenerativeModel(GEMINI_MODEL)
+    response = model.generate_content(prompt, stream=True)
+    parser = IncrementalJSONParser(field_validator=field_validator, on_field=on_field)
+    raw_chunks = []
+    usage_metadata = None
+
+    try:
+        for chunk in response:
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            if parser.complete:
+                continue # Anything after the closing brace is at most a code fence
+            try:
+                chunk_text = chunk.text
+            except ValueError: # Chunk without text parts, e.g. a safety or finish-reason only chunk
+                continue
+            raw_chunks.append(chunk_text)
+            parser.feed(chunk_text)
+        return parser.finish()
+    except JSONStreamError as e:
+        logger.error(f"LLM returned invalid JSON for {label}, aborted after {sum(map(len, raw_chunks))} chars: {e}\nRaw LLM output: {''.join(raw_chunks)}")
+        return None
+    finally:
+        _record_token_usage(purpose, label, usage_metadata, usage)
+
+
+def get_schema_org_json(raw_text, purpose="generation", usage=None):
     """
     Sends raw recipe text to a Gemini LLM and returns Schema.org Recipe JSON.
+    Tokens are counted under purpose ("generation" or "regeneration") and added to the optional usage dict.
     """
     if not os.getenv("GEMINI_API_KEY"):
         logger.error("GEMINI_API_KEY is not set in the .env file.")
         return None
 
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
         prompt = SCHEMA_ORG_LLM_PROMPT_TEMPLATE.format(recipe_text=raw_text)
-        response = model.generate_content(prompt)
-
-        if response and response.candidates:
-            json_str = response.text.strip()
-            if json_str.startswith("```json") and json_str.endswith("```"):
-                json_str = json_str[7:-3].strip()
-
-            try:
-                recipe_json = json.loads(json_str)
-                return recipe_json
-            except json.JSONDecodeError as e:
-                logger.error(f"LLM returned invalid JSON: {e}\nRaw LLM output: {json_str}")
-                return None
-        else:
-            logger.warning(f"LLM response contained no text candidates for processing.")
-            return None
-
+        return _generate_json(prompt, "Schema.org", field_validator=_validate_schema_org_field,
+                              on_field=_log_field_progress("Schema.org"), purpose=purpose, usage=usage)
     except Exception as e:
         logger.exception(f"Error calling LLM API for Schema.org: {e}")
         return None
 
-def get_create_recipe_json_intermediate(raw_text):
+def get_create_recipe_json_intermediate(raw_text, purpose="generation", usage=None):
     """
     Sends raw recipe text to a Gemini LLM and returns the intermediate Custom JSON.
+    Only malformed JSON aborts the stream; field types are checked and repaired after generation.
+    Tokens are counted under purpose ("generation" or "regeneration") and added to the optional usage dict.
     """
     if not os.getenv("GEMINI_API_KEY"):
         logger.error("GEMINI_API_KEY is not set in the .env file.")
         return None
 
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
         prompt = CREATE_RECIPE_LLM_PROMPT_TEMPLATE.format(recipe_text=raw_text)
-        response = model.generate_content(prompt)
+        return _generate_json(
+            prompt, "createRecipe",
+            on_field=_log_field_progress("createRecipe"),
+            purpose=purpose,
+            usage=usage
+        )
+    except Exception as e:
+        logger.exception(f"Error calling LLM API for createRecipe: {e}")
+        return None
 
-        if response and response.candidates:
-            json_str = response.text.strip()
-            if json_str.startswith("```json") and json_str.endswith("```"):
-                json_str = json_str[7:-3].strip()
+def get_schema_repair_patch(label, recipe_json, errors, usage=None):
+    """
+    Asks the LLM to fix only the failing parts of a recipe instead of regenerating it.
 
-            try:
-                recipe_json = json.loads(json_str)
-                return recipe_json
-            except json.JSONDecodeError as e:
-                logger.error(f"LLM returned invalid JSON: {e}\nRaw LLM output: {json_str}")
-                return None
-        else:
-            logger.warning(f"LLM response contained no text candidates for processing.")
-            return None
+    Args:
+        label (str): Output format name for prompts and logs (e.g. "createRecipe").
+        recipe_json (dict): The recipe that failed validation.
+        errors (list): (json_pointer_path, message) tuples from recipe_schemas.validate.
+        usage (dict, optional): Per-job token usage dict; repair tokens are added under "repair".
 
+    Returns:
+        dict: JSON Pointer path -> corrected value, or None if the model didn't return a usable patch.
+    """
+    if not os.getenv("GEMINI_API_KEY"):
+        logger.error("GEMINI_API_KEY is not set in the .env file.")
+        return None
+
+    failures = []
+    for path, message in errors:
+        failure = {"path": path, "error": message}
+        try:
+            failure["current_value"] = recipe_schemas.resolve_pointer(recipe_json, path)
+        except (KeyError, IndexError, TypeError, ValueError):
+            pass # Missing field: the error message names it
+        failures.append(failure)
+
+    try:
+        prompt = REPAIR_LLM_PROMPT_TEMPLATE.format(label=label, failures=json.dumps(failures, indent=2, ensure_ascii=False))
+        patch = _generate_json(prompt, label, purpose="repair", usage=usage)
+        if patch is not None and not all(isinstance(path, str) and path.startswith("/") for path in patch):
+            logger.error(f"LLM repair for {label} returned keys that are not JSON Pointer paths: {list(patch)}")
+            return None
+        return patch
     except Exception as e:
-        logger.exception(f"Error calling LLM API for createRecipe: {e}")
+        logger.exception(f"Error calling LLM API for {label} repair: {e}")
         return None
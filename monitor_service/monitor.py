@@ -1,17 +1,27 @@
-import os
 import time
+STARTUP_BEGAN = time.perf_counter() # Before the remaining imports so the logged startup time includes them
+
+import os
+import uuid
+import socket
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 from dotenv import load_dotenv
 from datetime import datetime
 
 import ocr_utils
-import llm_processor
 import file_manager
-import post_processor
 import notifier
-import api_sender 
+import pipeline
+import job_index
+import llm_processor
+import recipe_schemas
+import polling_watcher
+import work_claims
+import segmentation
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +32,36 @@ OUTPUT_DIR = "/app/output"
 ARCHIVE_DIR = "/app/archive"
 LOG_DIR = "/app/logs"
 LOG_FILE = os.path.join(LOG_DIR, "recipe_processor.log")
+JOB_INDEX_DB = os.path.join(OUTPUT_DIR, job_index.DB_FILE_NAME) # SQLite index of jobs, also read by the web UI
+
+# Watcher Configuration
+# "inotify" uses watchdog's native Observer; "polling" suits network shares where inotify events
+# from other hosts never arrive (see polling_watcher.py).
+WATCH_MODE = os.getenv("WATCH_MODE", "inotify").lower()
+WATCH_RECURSIVE = os.getenv("WATCH_RECURSIVE", "false").lower() == "true" # Also watch subfolders of INPUT_DIR
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "1")) # Seconds between scans while files are arriving
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "30")) # Seconds between scans once the folder is idle
+# inotify reports a file as soon as it is created, possibly mid-copy, so the handler waits this long first.
+# Web UI uploads are renamed in complete; set to 0 if nothing else writes into INPUT_DIR directly.
+SETTLE_SECONDS = float(os.getenv("SETTLE_SECONDS", "2"))
+
+# Scale-out Configuration
+# With WORK_CLAIMS enabled, several monitors can share INPUT_DIR: each file is claimed by exactly one
+# node via an atomic rename into INPUT_DIR/.claims/<NODE_ID>/ (see work_claims.py).
+WORK_CLAIMS = os.getenv("WORK_CLAIMS", "false").lower() == "true"
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname() # The container ID under Docker
+CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "120")) # A node silent this long loses its claims
+CLAIM_HEARTBEAT_SECONDS = int(os.getenv("CLAIM_HEARTBEAT_SECONDS", "30"))
+if WORK_CLAIMS:
+    # A RotatingFileHandler is only safe with a single writing process, so each node logs to its own file
+    # (the web UI merges them). The job index stays shared: SQLite locking is safe between processes on one host.
+    LOG_FILE = os.path.join(LOG_DIR, f"recipe_processor.{NODE_ID}.log")
+
+# Multi-recipe page Configuration
+# Photos of pages with several recipes are split into one job per recipe using Vision's layout (see segmentation.py)
+# Off by default: a component heading as large as the recipe title can still be taken for a new recipe
+SPLIT_MULTI_RECIPE_PAGES = os.getenv("SPLIT_MULTI_RECIPE_PAGES", "false").lower() == "true"
+MAX_PARALLEL_RECIPES = int(os.getenv("MAX_PARALLEL_RECIPES", "3")) # LLM jobs run at once for one page
 
 # Log Rotation Configuration
 MAX_LOG_SIZE_MB = 5  # Max size of each log file in MB
@@ -41,7 +81,7 @@ os.makedirs(LOG_DIR, exist_ok=True)
 print(f"DEBUG: Attempting to configure logging to file: {LOG_FILE} with rotation.")
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=f'%(asctime)s - {NODE_ID} - %(levelname)s - %(message)s' if WORK_CLAIMS else '%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         # Use RotatingFileHandler instead of FileHandler
         logging.handlers.RotatingFileHandler(
@@ -55,121 +95,114 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def warm_up_backends():
+    """Initializes the heavy SDK clients in the background once the watcher is live, so the first file doesn't pay for it."""
+    for name, warm_up in (("Vision/pdfminer", ocr_utils.warm_up), ("Gemini", llm_processor.warm_up), ("JSON schemas", recipe_schemas.warm_up)):
+        started = time.perf_counter()
+        try:
+            warm_up()
+            logger.info(f"Warm-up of {name} finished in {time.perf_counter() - started:.2f}s.")
+        except Exception as e:
+            # Not fatal: the backend is initialized again on first use and will report the error then
+            logger.error(f"Warm-up of {name} failed: {e}")
+
+
+def is_hidden_path(path):
+    """True for paths inside hidden files or folders under INPUT_DIR, such as the .claims work area."""
+    relative_path = os.path.relpath(path, INPUT_DIR)
+    return any(part.startswith(".") for part in relative_path.split(os.sep))
+
+
 class RecipeFileHandler(FileSystemEventHandler):
+    def __init__(self, settle_seconds=2, claims=None):
+        super().__init__()
+        # How long to wait for a file to finish copying. The polling watcher only reports files
+        # whose size has already stopped changing, so it needs no wait.
+        self.settle_seconds = settle_seconds
+        self.claims = claims # work_claims.ClaimManager when several monitors share INPUT_DIR
+
+    def on_moved(self, event):
+        # Files renamed into the input folder (e.g. claims requeued from a dead node) are new work
+        if not event.is_directory:
+            self.on_created(FileCreatedEvent(event.dest_path))
+
+    def claim_lost(self, file_path):
+        """True if this node's claim on file_path expired and another node requeued it; the job must then be dropped."""
+        return self.claims is not None and not self.claims.holds(file_path)
+
+    def archive(self, file_path, success):
+        """Moves a processed file to the archive, unless this node lost its claim on it. Returns False if it did."""
+        if self.claim_lost(file_path):
+            logger.warning(f"Claim on '{os.path.basename(file_path)}' was lost (lease expired); another node is processing it. Not archiving.")
+            return False
+        file_manager.move_to_archive(file_path, ARCHIVE_DIR, success=success)
+        return True
+
     def on_created(self, event):
-        if event.is_directory:
+        if event.is_directory or is_hidden_path(event.src_path):
             return
 
         file_path = event.src_path
         file_name = os.path.basename(file_path)
         logger.info(f"Detected new file: {file_name}")
 
-        time.sleep(2) # Give file time to fully copy
+        time.sleep(self.settle_seconds) # Give file time to fully copy
+
+        if self.claims:
+            file_path = self.claims.claim(file_path)
+            if file_path is None:
+                return # Another node is processing it
 
+        job_id = None
         try:
             # 1. Extract Text (using Vision AI now)
-            if file_name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                raw_text = ocr_utils.extract_text_from_image(file_path)
-            elif file_name.lower().endswith('.pdf'):
-                raw_text = ocr_utils.extract_text_from_pdf(file_path)
-            else:
+            is_image = file_name.lower().endswith(('.jpg', '.jpeg', '.png'))
+            if not is_image and not file_name.lower().endswith('.pdf'):
                 logger.warning(f"Skipping unsupported file type: {file_name}")
-                file_manager.move_to_archive(file_path, ARCHIVE_DIR, success=False)
+                self.archive(file_path, success=False)
                 return
 
+            # --- Unique per-job output subfolder: timestamp for readability, random suffix so
+            # two files processed in the same second never share a folder ---
+            job_id = f"{datetime.now().strftime('%Y-%m-%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            current_output_sub_dir = os.path.join(OUTPUT_DIR, job_id)
+            source_hash = job_index.file_sha256(file_path)
+            job_index.start_job(JOB_INDEX_DB, job_id, file_name, source_hash, current_output_sub_dir)
+            job_started = time.perf_counter()
+
+            if is_image:
+                # Keep Vision's layout, not just its text, so pages with several recipes can be split
+                annotation = ocr_utils.extract_document_from_image(file_path)
+                raw_text = annotation.text if annotation else ""
+            else:
+                annotation = None
+                raw_text = ocr_utils.extract_text_from_pdf(file_path)
+            timings = {"ocr_seconds": time.perf_counter() - job_started}
+
             if not raw_text.strip():
                 logger.error(f"No text extracted from {file_name}. Skipping LLM processing.")
-                file_manager.move_to_archive(file_path, ARCHIVE_DIR, success=False)
+                self.archive(file_path, success=False)
+                job_index.update_job(JOB_INDEX_DB, job_id, status=job_index.STATUS_FAILED, message="No text extracted",
+                                     finished_at=datetime.now().isoformat(timespec="seconds"), total_seconds=time.perf_counter() - job_started, **timings)
                 return
 
             logger.info(f"Text extracted from {file_name}. Proceeding to LLM conversion(s)...")
 
-            # --- Create timestamped output subfolder ---
-            now_bst = datetime.now() 
-            timestamp_folder_name = now_bst.strftime("%Y-%m-%d_%H%M%S")
-            
-            current_output_sub_dir = os.path.join(OUTPUT_DIR, timestamp_folder_name)
-            os.makedirs(current_output_sub_dir, exist_ok=True)
-            logger.info(f"Created output subfolder: {current_output_sub_dir}")
-            # --- End timestamped subfolder setup ---
-
-            # Save raw OCR text for debugging (now goes into the timestamped folder)
-            raw_text_output_file = os.path.join(current_output_sub_dir, os.path.splitext(file_name)[0] + "_raw_ocr.txt")
-            logger.debug(f"Attempting to save raw OCR text to: {raw_text_output_file}")
-            with open(raw_text_output_file, 'w', encoding='utf-8') as f:
-                f.write(raw_text)
-            logger.info(f"Raw OCR text saved to: {raw_text_output_file}")
-
-
-            # Flag to track if API send was attempted and successful
-            api_send_successful = False # Initialize to False
-
-            # 2. Process with LLM for Schema.org
-            logger.info("Generating Schema.org JSON...")
-            schema_org_json_output = llm_processor.get_schema_org_json(raw_text)
-            
-            if schema_org_json_output:
-                schema_org_output_path = os.path.join(current_output_sub_dir, "schema_org_recipe.json")
-                file_manager.save_json_file(schema_org_json_output, schema_org_output_path)
-                logger.info(f"Successfully generated and saved Schema.org JSON.")
+            regions = [raw_text]
+            if annotation and SPLIT_MULTI_RECIPE_PAGES:
+                try:
+                    regions = segmentation.split_recipes(annotation)
+                except Exception as e:
+                    # Splitting is an optimization; the page still works as a single recipe
+                    logger.error(f"Layout segmentation of {file_name} failed, processing it as one recipe: {e}")
+            if len(regions) > 1:
+                overall_success = self.process_regions(file_name, source_hash, raw_text, regions, job_id, current_output_sub_dir, job_started, timings, source_path=file_path)
             else:
-                logger.error("Failed to generate Schema.org JSON.")
-                notifier.send_pushover_notification(f"ERROR: Failed to generate Schema.org JSON for '{file_name}'", title="Recipe Conversion Failed", priority=1)
-
-
-            # 3. Process with LLM for createRecipe (Intermediate)
-            logger.info("Generating createRecipe (intermediate) JSON...")
-            create_recipe_intermediate_json_output = llm_processor.get_create_recipe_json_intermediate(raw_text)
-
-            create_recipe_output_path = os.path.join(current_output_sub_dir, "create_recipe_intermediate.json")
-            if create_recipe_intermediate_json_output:
-                file_manager.save_json_file(create_recipe_intermediate_json_output, create_recipe_output_path)
-                logger.info(f"Successfully generated and saved createRecipe (intermediate) JSON.")
-                
-                # --- CALL POST-PROCESSING HERE, PASSING NOTIFIER ---
-                logger.info("Starting post-processing for createRecipe JSON and anomaly checks...")
-                post_process_success = post_processor.post_process_create_recipe_json(
-                    create_recipe_output_path,
-                    send_notification_func=notifier.send_pushover_notification # Pass the Pushover function
-                )
-                if post_process_success:
-                    logger.info("createRecipe JSON post-processing completed successfully.")
-                    
-                    # --- NEW: Send to External API after post-processing ---
-                    logger.info("Attempting to send processed createRecipe JSON to external API...")
-                    # Load the JSON from disk again to ensure post-processing changes are included
-                    loaded_processed_json = file_manager.load_json_file(create_recipe_output_path) 
-                    if loaded_processed_json: # Ensure file was loaded correctly
-                        api_send_successful = api_sender.send_recipe_to_api(
-                            recipe_json_data=loaded_processed_json, 
-                            api_url=API_ENDPOINT,
-                            bearer_token=API_BEARER_TOKEN, # Pass Bearer Token
-                            send_notification_func=notifier.send_pushover_notification,
-                            original_file_name=file_name
-                        )
-                    else:
-                        api_send_successful = False # Set to False if loading failed
-                        logger.error(f"Could not load post-processed JSON for '{file_name}' to send to API. API send skipped.")
-                        notifier.send_pushover_notification(f"ERROR: Could not load post-processed JSON for '{file_name}' to send to API.", title="API Send Skipped", priority=1)
-
-                    if api_send_successful:
-                        logger.info(f"Successfully sent '{file_name}' to external API.")
-                    else:
-                        logger.error(f"Failed to send '{file_name}' to external API. Check logs/Pushover for details.")
-                    # --- END NEW ---
-
-                else:
-                    logger.warning("createRecipe JSON post-processing encountered issues. Check logs for details.")
-                    notifier.send_pushover_notification(f"WARNING: Post-processing issues for '{file_name}'. Check logs!", title="Recipe Post-Processing Issue", priority=1)
-            else:
-                logger.error(f"Failed to generate createRecipe (intermediate) JSON.")
-                notifier.send_pushover_notification(f"ERROR: Failed to generate createRecipe JSON for '{file_name}'", title="Recipe Conversion Failed", priority=1)
-
+                overall_success = self.process_recipe(file_name, raw_text, job_id, current_output_sub_dir, job_started, timings, source_path=file_path)
 
             # 4. Move original file to archive
-            # Decide overall success based on at least one JSON being generated AND API send success (if attempted for createRecipe)
-            overall_success = bool(schema_org_json_output or (create_recipe_intermediate_json_output and api_send_successful)) 
-            file_manager.move_to_archive(file_path, ARCHIVE_DIR, success=overall_success)
+            if not self.archive(file_path, success=overall_success):
+                return
             if overall_success:
                 notifier.send_pushover_notification(f"'{file_name}' processed (JSONs generated & API sent).", title="Recipe Processed Successfully", priority=-1) # Low priority success
             else:
@@ -179,19 +212,162 @@ class RecipeFileHandler(FileSystemEventHandler):
         except Exception as e:
             logger.exception(f"CRITICAL SYSTEM ERROR during processing of '{file_name}': {e}")
             notifier.send_pushover_notification(f"CRITICAL SYSTEM ERROR: Processing '{file_name}' failed. Details in logs!", title="Recipe Processing Critical Error", priority=2)
-            file_manager.move_to_archive(file_path, ARCHIVE_DIR, success=False)
+            self.archive(file_path, success=False)
+            if job_id:
+                job_index.update_job(JOB_INDEX_DB, job_id, status=job_index.STATUS_ERROR, message=str(e),
+                                     finished_at=datetime.now().isoformat(timespec="seconds"))
+        finally:
+            if self.claims:
+                self.claims.release(file_path)
+
+    def process_recipe(self, file_name, raw_text, job_id, current_output_sub_dir, job_started, timings, source_path=None):
+        """
+        Runs the LLM, post-processing and send stages for one recipe's text and records the outcome in the job index.
+        source_path is the claimed input file; if the claim was lost by the time the recipe is ready, it isn't sent.
+
+        Returns:
+            bool: True if at least one JSON was generated and, for createRecipe, sent to the API.
+        """
+        os.makedirs(current_output_sub_dir, exist_ok=True)
+        logger.info(f"Created output subfolder: {current_output_sub_dir}")
+        # --- End output subfolder setup ---
+
+        # Save raw OCR text for debugging (now goes into the job folder)
+        artifacts = {"raw_ocr": pipeline.save_raw_text(raw_text, current_output_sub_dir, file_name)}
+
+        # Flag to track if API send was attempted and successful
+        api_send_successful = False # Initialize to False
+        message = None
+        token_usage = {} # Tokens spent on generation / schema repair / regeneration for this job
+
+        # 2./3. Process with LLM for Schema.org and createRecipe (Intermediate)
+        stage_started = time.perf_counter()
+        schema_org_json_output, create_recipe_intermediate_json_output = pipeline.run_llm_stage(
+            raw_text, current_output_sub_dir, file_name,
+            send_notification_func=notifier.send_pushover_notification,
+            usage=token_usage
+        )
+        timings["llm_seconds"] = time.perf_counter() - stage_started
+        if schema_org_json_output:
+            artifacts["schema_org"] = os.path.join(current_output_sub_dir, pipeline.SCHEMA_ORG_FILE)
+
+        if create_recipe_intermediate_json_output:
+            artifacts["create_recipe"] = os.path.join(current_output_sub_dir, pipeline.CREATE_RECIPE_FILE)
+
+            # --- CALL POST-PROCESSING HERE, PASSING NOTIFIER ---
+            stage_started = time.perf_counter()
+            post_process_success = pipeline.run_post_process_stage(
+                current_output_sub_dir, file_name,
+                send_notification_func=notifier.send_pushover_notification # Pass the Pushover function
+            )
+            timings["post_process_seconds"] = time.perf_counter() - stage_started
+            if post_process_success:
+                artifacts["processed_recipe"] = os.path.join(current_output_sub_dir, pipeline.PROCESSED_RECIPE_FILE)
+            if post_process_success and source_path and self.claim_lost(source_path):
+                # Fencing: the node that requeued the file processes and sends it; sending here would duplicate the recipe
+                message = "Claim lost before sending (lease expired); processed by another node"
+                logger.warning(f"{message}: '{file_name}'. Not sending to API.")
+            elif post_process_success:
+                # --- NEW: Send to External API after post-processing ---
+                stage_started = time.perf_counter()
+                api_send_successful = pipeline.run_send_stage(
+                    current_output_sub_dir, file_name,
+                    api_url=API_ENDPOINT,
+                    bearer_token=API_BEARER_TOKEN, # Pass Bearer Token
+                    send_notification_func=notifier.send_pushover_notification,
+                    usage=token_usage
+                )
+                timings["send_seconds"] = time.perf_counter() - stage_started
+                # --- END NEW ---
+
+        # Decide overall success based on at least one JSON being generated AND API send success (if attempted for createRecipe)
+        overall_success = pipeline.job_succeeded(schema_org_json_output, create_recipe_intermediate_json_output, api_send_successful)
+        recipe_name = (create_recipe_intermediate_json_output or {}).get("name") or (schema_org_json_output or {}).get("name")
+        job_index.update_job(
+            JOB_INDEX_DB, job_id,
+            recipe_name=recipe_name,
+            status=job_index.STATUS_SUCCESS if overall_success else job_index.STATUS_FAILED,
+            message=message,
+            finished_at=datetime.now().isoformat(timespec="seconds"),
+            total_seconds=time.perf_counter() - job_started,
+            artifacts=artifacts,
+            token_usage=token_usage,
+            **timings
+        )
+        return overall_success
+
+    def process_regions(self, file_name, source_hash, raw_text, regions, job_id, current_output_sub_dir, job_started, timings, source_path=None):
+        """
+        Processes a page holding several recipes: each region becomes its own job (<job_id>_r<n>, with its own
+        output folder) and the jobs run in parallel. The page's own job is marked 'split'.
+
+        Returns:
+            bool: True if every recipe on the page was processed successfully.
+        """
+        os.makedirs(current_output_sub_dir, exist_ok=True)
+        page_ocr_path = os.path.join(current_output_sub_dir, pipeline.PAGE_OCR_FILE)
+        with open(page_ocr_path, 'w', encoding='utf-8') as f:
+            f.write(raw_text)
+
+        name, extension = os.path.splitext(file_name)
+        region_jobs = []
+        for number, region_text in enumerate(regions, start=1):
+            region_job_id = f"{job_id}_r{number}"
+            region_output_dir = os.path.join(OUTPUT_DIR, region_job_id)
+            job_index.start_job(JOB_INDEX_DB, region_job_id, file_name, source_hash, region_output_dir)
+            region_jobs.append((region_job_id, region_output_dir, f"{name}_recipe{number}{extension}", region_text))
+        logger.info(f"'{file_name}' holds {len(regions)} recipes. Processing them as jobs {', '.join(job[0] for job in region_jobs)}.")
+
+        def run_region(region_job_id, region_output_dir, region_file_name, region_text):
+            try:
+                return self.process_recipe(region_file_name, region_text, region_job_id, region_output_dir, time.perf_counter(), {}, source_path=source_path)
+            except Exception as e:
+                logger.exception(f"Error processing '{region_file_name}': {e}")
+                job_index.update_job(JOB_INDEX_DB, region_job_id, status=job_index.STATUS_ERROR, message=str(e),
+                                     finished_at=datetime.now().isoformat(timespec="seconds"))
+                return False
+
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_RECIPES, len(region_jobs))) as executor:
+            results = list(executor.map(lambda job: run_region(*job), region_jobs))
+
+        job_index.update_job(
+            JOB_INDEX_DB, job_id,
+            status=job_index.STATUS_SPLIT,
+            message=f"Split into {len(regions)} recipes, {sum(results)} processed successfully",
+            finished_at=datetime.now().isoformat(timespec="seconds"),
+            total_seconds=time.perf_counter() - job_started,
+            artifacts={"page_ocr": page_ocr_path, **{f"recipe_{number}": job[1] for number, job in enumerate(region_jobs, start=1)}},
+            **timings
+        )
+        return all(results)
 
 if __name__ == "__main__":
     logger.info(f"Starting recipe monitor for {INPUT_DIR}...")
-    event_handler = RecipeFileHandler()
-    observer = Observer()
-    observer.schedule(event_handler, INPUT_DIR, recursive=False)
+    job_index.init_db(JOB_INDEX_DB)
+    claims = None
+    if WORK_CLAIMS:
+        claims = work_claims.ClaimManager(INPUT_DIR, node_id=NODE_ID, lease_seconds=CLAIM_LEASE_SECONDS, heartbeat_interval=CLAIM_HEARTBEAT_SECONDS)
+    if WATCH_MODE == "polling":
+        event_handler = RecipeFileHandler(settle_seconds=0, claims=claims)
+        observer = polling_watcher.PollingWatcher(min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL)
+    else:
+        event_handler = RecipeFileHandler(settle_seconds=SETTLE_SECONDS, claims=claims)
+        observer = Observer()
+    observer.schedule(event_handler, INPUT_DIR, recursive=WATCH_RECURSIVE)
     observer.start()
+    logger.info(f"Watching {INPUT_DIR} ({WATCH_MODE}, recursive={WATCH_RECURSIVE}); monitor ready {time.perf_counter() - STARTUP_BEGAN:.2f}s after start.")
+    threading.Thread(target=warm_up_backends, name="warm-up", daemon=True).start()
+    if claims:
+        # Started after the watcher so files requeued from a previous run are seen as new. Both watchers
+        # finish their initial setup inside start() (PollingWatcher indexes existing files before returning).
+        claims.start()
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
+        if claims:
+            claims.stop()
     observer.join()
     logger.info("Recipe monitor stopped.")
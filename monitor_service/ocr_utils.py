@@ -1,26 +1,60 @@
+import io
 import logging
 import os
-from PIL import Image
-from pdfminer.high_level import extract_text as extract_pdf_text
-import io
-
-# Import Google Cloud Vision API client
-from google.cloud import vision_v1p3beta1 as vision # Using v1p3beta1 for robust features, or use vision_v1
-from google.api_core.client_options import ClientOptions
-from google.api_core.exceptions import GoogleAPICallError
+import threading
 
 logger = logging.getLogger(__name__)
 
-# Initialize Vision AI client with API key (assuming GEMINI_API_KEY works for Vision)
-# It's better practice to use GOOGLE_APPLICATION_CREDENTIALS for service accounts
-# but for simplicity with existing API key, we'll try this.
-VISION_API_KEY = os.getenv("GEMINI_API_KEY") # Use your existing API key
-client_options = ClientOptions(api_key=VISION_API_KEY)
-vision_client = vision.ImageAnnotatorClient(client_options=client_options)
+# Per-job memory ceiling: the most file content or extracted text a single job holds in memory.
+# Larger images are downscaled before upload; larger scanned PDFs can't be OCR'd inline and are skipped.
+MAX_JOB_MEMORY_MB = int(os.getenv("MAX_JOB_MEMORY_MB", "20"))
+MAX_JOB_MEMORY_BYTES = MAX_JOB_MEMORY_MB * 1024 * 1024
+SCANNED_PDF_PAGES = 3 # Leading pages without a text layer after which a PDF is treated as scanned
+MAX_UPLOAD_DIMENSION = 4096 # Longest side, in pixels, of images downscaled for Vision AI
 
+# The Google Cloud Vision SDK and pdfminer take seconds to import and connect, so they are loaded on
+# first use (or by warm_up() in the background once the watcher is live) instead of at import time.
+_vision = None
+_vision_client = None
+_vision_lock = threading.Lock()
 
-def detect_text_from_image_gcp(image_content):
-    """Detects text in an image using Google Cloud Vision AI."""
+
+def _get_vision_client():
+    """Imports the Vision SDK and creates the client once; later calls return the cached pair."""
+    global _vision, _vision_client
+    if _vision_client is None:
+        with _vision_lock:
+            if _vision_client is None:
+                # Import Google Cloud Vision API client
+                from google.cloud import vision_v1p3beta1 as vision # Using v1p3beta1 for robust features, or use vision_v1
+                from google.api_core.client_options import ClientOptions
+
+                # Initialize Vision AI client with API key (assuming GEMINI_API_KEY works for Vision)
+                # It's better practice to use GOOGLE_APPLICATION_CREDENTIALS for service accounts
+                # but for simplicity with existing API key, we'll try this.
+                VISION_API_KEY = os.getenv("GEMINI_API_KEY") # Use your existing API key
+                client_options = ClientOptions(api_key=VISION_API_KEY)
+                _vision = vision
+                _vision_client = vision.ImageAnnotatorClient(client_options=client_options)
+    return _vision, _vision_client
+
+
+def warm_up():
+    """Loads the Vision client and pdfminer ahead of the first file."""
+    _get_vision_client()
+    import pdfminer.high_level # noqa: F401
+
+
+def detect_document_from_image_gcp(image_content):
+    """
+    Runs Google Cloud Vision AI document text detection on an image.
+
+    Returns:
+        The full_text_annotation (text plus the page/block/paragraph layout with bounding boxes),
+        or None if nothing was detected or the call failed.
+    """
+    from google.api_core.exceptions import GoogleAPICallError
+    vision, vision_client = _get_vision_client()
     image = vision.Image(content=image_content)
     
     try:
@@ -29,63 +63,156 @@ def detect_text_from_image_gcp(image_content):
         # Or use text_detection for simpler, less dense text:
         # response = vision_client.text_detection(image=image)
         
-        return response.full_text_annotation.text if response.full_text_annotation else ""
+        return response.full_text_annotation or None
     except GoogleAPICallError as e:
         logger.error(f"Google Cloud Vision API error: {e}")
-        return ""
+        return None
     except Exception as e:
         logger.error(f"Error calling Google Cloud Vision API: {e}")
-        return ""
+        return None
 
 
-def extract_text_from_image(image_path):
-    """Extracts text from a JPG/PNG image using Google Cloud Vision AI."""
+def detect_text_from_image_gcp(image_content):
+    """Detects text in an image using Google Cloud Vision AI."""
+    annotation = detect_document_from_image_gcp(image_content)
+    return annotation.text if annotation else ""
+
+
+def _read_for_upload(file_path):
+    """
+    Reads a file for an inline Vision request, which has to hold the whole image in memory.
+    Returns None if the file is larger than the per-job memory ceiling.
+    """
+    if os.path.getsize(file_path) > MAX_JOB_MEMORY_BYTES:
+        return None
+    with open(file_path, 'rb') as f:
+        return f.read() # A single read sized from fstat: the content is buffered once, not twice
+
+
+def _downscale_image_for_upload(image_path):
+    """
+    Re-encodes an oversized image as a JPEG that fits in the per-job memory ceiling.
+
+    JPEGs are decoded at a reduced scale (PIL draft mode, 1/2, 1/4 or 1/8) chosen so the decoded RGB
+    bitmap itself fits in the ceiling; the full-resolution bitmap is never held in memory. Other formats
+    must be fully decoded; they are rejected if that would exceed the ceiling.
+    Returns the encoded bytes, or None if the image can't be brought under the ceiling.
+    """
+    from PIL import Image
+
+    # PIL's decompression bomb limit (~179 MP) would reject large scans in Image.open(); the decoded size
+    # is bounded here instead, by the draft scale and the ceiling checks below.
+    Image.MAX_IMAGE_PIXELS = None
+    with Image.open(image_path) as image: # Lazy: only the header is read here
+        width, height = image.size
+        if image.format == "JPEG":
+            scale = next((scale for scale in (1, 2, 4, 8) if -(-width // scale) * -(-height // scale) * 3 <= MAX_JOB_MEMORY_BYTES), None)
+            if scale is None:
+                logger.error(f"{image_path} is {width}x{height}; even decoded at 1/8 scale it would exceed the {MAX_JOB_MEMORY_MB} MB job memory ceiling.")
+                return None
+            # draft() picks the largest reduction with width // requested >= scale, i.e. exactly this scale
+            image.draft("RGB", (width // scale, height // scale))
+        elif width * height * 4 > MAX_JOB_MEMORY_BYTES:
+            logger.error(f"{image_path} is {width}x{height} {image.format}; decoding it would exceed the {MAX_JOB_MEMORY_MB} MB job memory ceiling.")
+            return None
+
+        if image.mode != "RGB": # Draft mode already decodes colour JPEGs as RGB; anything else needs one conversion
+            image = image.convert("RGB")
+        image.thumbnail((MAX_UPLOAD_DIMENSION, MAX_UPLOAD_DIMENSION))
+        for quality in (90, 75, 60):
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=quality)
+            if buffer.tell() <= MAX_JOB_MEMORY_BYTES:
+                logger.info(f"Downscaled {image_path} from {width}x{height} to {image.size[0]}x{image.size[1]} (JPEG q{quality}, {buffer.tell() // 1024} KB) for Vision AI.")
+                return buffer.getvalue()
+    logger.error(f"Could not fit {image_path} under the {MAX_JOB_MEMORY_MB} MB job memory ceiling.")
+    return None
+
+
+def extract_document_from_image(image_path):
+    """
+    Runs document text detection on a JPG/PNG image using Google Cloud Vision AI.
+
+    Returns:
+        The full_text_annotation, whose layout segmentation.py uses to split multi-recipe pages,
+        or None if no text was found.
+    """
     try:
-        with open(image_path, 'rb') as image_file:
-            content = image_file.read()
-        
-        text = detect_text_from_image_gcp(content)
-        return text
+        content = _read_for_upload(image_path)
+        if content is None:
+            logger.info(f"{image_path} exceeds the {MAX_JOB_MEMORY_MB} MB job memory ceiling. Downscaling before upload...")
+            content = _downscale_image_for_upload(image_path)
+            if content is None:
+                return None
+
+        return detect_document_from_image_gcp(content)
     except Exception as e:
         logger.error(f"Error processing image {image_path} for Vision AI: {e}")
-        return ""
+        return None
+
+
+def extract_text_from_image(image_path):
+    """Extracts text from a JPG/PNG image using Google Cloud Vision AI."""
+    annotation = extract_document_from_image(image_path)
+    return annotation.text if annotation else ""
+
+
+def _extract_searchable_pdf_text(pdf_path):
+    """
+    Extracts the text layer of a PDF one page at a time with pdfminer.six.
+
+    Only one page's layout is held in memory at once. Returns "" once the first SCANNED_PDF_PAGES pages
+    all turn out to have no text layer (a scanned PDF), without parsing the remaining pages; a photo or
+    cover page in front of searchable pages doesn't count as scanned. Stops collecting text once it
+    reaches the per-job memory ceiling.
+    """
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    page_texts = []
+    collected_chars = 0
+    found_text = False
+    with open(pdf_path, 'rb') as fp:
+        for page_number, page_layout in enumerate(extract_pages(fp), start=1):
+            page_text = "".join(element.get_text() for element in page_layout if isinstance(element, LTTextContainer))
+            found_text = found_text or bool(page_text.strip())
+            if not found_text and page_number >= SCANNED_PDF_PAGES:
+                return ""
+            page_texts.append(page_text + "\f") # Form feed between pages, as pdfminer's extract_text does
+            collected_chars += len(page_text)
+            if collected_chars >= MAX_JOB_MEMORY_BYTES:
+                logger.warning(f"Text of {pdf_path} exceeds the {MAX_JOB_MEMORY_MB} MB job memory ceiling. Stopped after page {page_number}.")
+                break
+    return "".join(page_texts)
 
 
 def extract_text_from_pdf(pdf_path):
     """
     Extracts text from a PDF.
-    Attempts direct text extraction (for searchable PDFs) first.
+    Attempts direct text extraction (for searchable PDFs) first, page by page.
     If no text is found, it falls back to OCR via Vision AI.
     For multi-page PDFs, Vision AI can process them directly but requires GCS.
     For local files, a simple fallback is to convert to images and then OCR.
     """
     try:
         # Try to extract searchable text first using pdfminer.six
-        with open(pdf_path, 'rb') as fp:
-            text = extract_pdf_text(fp)
+        text = _extract_searchable_pdf_text(pdf_path)
         if text.strip(): # If text is found, it's a searchable PDF
             logger.info(f"Successfully extracted searchable text from PDF: {pdf_path}")
             return text
-        else: # PDF is likely scanned or image-based, attempt OCR
-            logger.info(f"No searchable text in {pdf_path}, attempting OCR via Vision AI...")
-            # For simplicity, if pdfminer.six fails, we'll try to treat the PDF
-            # as a single image for Vision AI. For multi-page PDFs,
-            # you'd need to iterate pages (e.g., using pdf2image) or use Vision AI's
-            # batch document text detection from GCS.
-            with open(pdf_path, 'rb') as pdf_file:
-                content = pdf_file.read()
-            # Note: Directly sending PDF content might work for single-page image PDFs,
-            # but for multi-page PDFs with Cloud Vision, it's better to use GCS.
-            # As a simpler fallback for now, let's treat it as an image.
-            # For better multi-page PDF OCR, you'd use Vision AI's async document detection on GCS.
-            return detect_text_from_image_gcp(content)
-            
+        # PDF is likely scanned or image-based, attempt OCR
+        logger.info(f"No searchable text in {pdf_path}, attempting OCR via Vision AI...")
     except Exception as e:
         logger.error(f"Error extracting text from PDF {pdf_path}: {e}. Falling back to Vision AI OCR.")
-        try:
-            with open(pdf_path, 'rb') as pdf_file:
-                content = pdf_file.read()
-            return detect_text_from_image_gcp(content)
-        except Exception as e_fallback:
-            logger.error(f"Error in Vision AI fallback for PDF {pdf_path}: {e_fallback}")
+
+    # For simplicity, we treat the PDF as a single image for Vision AI. This works for single-page
+    # image PDFs; for better multi-page PDF OCR, you'd use Vision AI's async document detection on GCS.
+    try:
+        content = _read_for_upload(pdf_path)
+        if content is None:
+            logger.error(f"{pdf_path} exceeds the {MAX_JOB_MEMORY_MB} MB job memory ceiling for inline Vision AI OCR. Skipping OCR.")
             return ""
+        return detect_text_from_image_gcp(content)
+    except Exception as e_fallback:
+        logger.error(f"Error in Vision AI fallback for PDF {pdf_path}: {e_fallback}")
+        return ""
@@ -0,0 +1,208 @@
+# monitor_service/pipeline.py
+import os
+import logging
+
+import llm_processor
+import file_manager
+import post_processor
+import api_sender
+import recipe_schemas
+
+logger = logging.getLogger(__name__)
+
+# Artifact names written into each output folder. replay.py relies on these to
+# restart a run from any stage without re-running OCR.
+RAW_OCR_SUFFIX = "_raw_ocr.txt"
+SCHEMA_ORG_FILE = "schema_org_recipe.json"
+CREATE_RECIPE_FILE = "create_recipe_intermediate.json" # LLM output, never modified afterwards
+# createRecipe JSON after post-processing (and any schema repair before sending): what is sent to the API.
+# Kept apart from the LLM output so replaying post_process re-applies the rules to the original data.
+PROCESSED_RECIPE_FILE = "create_recipe_processed.json"
+# Whole-page OCR text of a page that was split into several recipe jobs. Deliberately not named like raw
+# OCR text, so replay.py doesn't re-run the whole page as one recipe.
+PAGE_OCR_FILE = "page_ocr.txt"
+
+# Pipeline stages in execution order. Replaying from a stage re-runs it and every stage after it.
+STAGES = ("llm", "post_process", "send")
+
+
+def job_succeeded(schema_org_json, create_recipe_json, api_send_successful):
+    """A job succeeds if Schema.org JSON was generated, or createRecipe JSON was generated and sent to the API."""
+    return bool(schema_org_json or (create_recipe_json and api_send_successful))
+
+
+def save_raw_text(raw_text, output_dir, file_name):
+    """Saves the raw OCR text next to the generated JSON so later stages can be replayed."""
+    raw_text_output_file = os.path.join(output_dir, os.path.splitext(file_name)[0] + RAW_OCR_SUFFIX)
+    logger.debug(f"Attempting to save raw OCR text to: {raw_text_output_file}")
+    with open(raw_text_output_file, 'w', encoding='utf-8') as f:
+        f.write(raw_text)
+    logger.info(f"Raw OCR text saved to: {raw_text_output_file}")
+    return raw_text_output_file
+
+
+def find_raw_text_file(output_dir):
+    """Returns the path of the saved raw OCR text in an output folder, or None if there is none."""
+    for entry in sorted(os.listdir(output_dir)):
+        if entry.endswith(RAW_OCR_SUFFIX):
+            return os.path.join(output_dir, entry)
+    return None
+
+
+def repair_recipe(kind, label, recipe_json, errors, usage=None):
+    """
+    Sends only the failing paths and error messages back to the LLM and applies its corrections.
+
+    Returns:
+        tuple: (recipe_json, remaining_errors); the original recipe if no usable patch came back.
+    """
+    logger.warning(f"{label} JSON failed schema validation at {len(errors)} path(s): " + "; ".join(f"{path or '/'}: {message}" for path, message in errors))
+    patch = llm_processor.get_schema_repair_patch(label, recipe_json, errors, usage=usage)
+    if not patch:
+        return recipe_json, errors
+    repaired = recipe_schemas.apply_patch(recipe_json, patch)
+    remaining_errors = recipe_schemas.validate(kind, repaired)
+    if remaining_errors:
+        logger.warning(f"{label} JSON still has {len(remaining_errors)} schema error(s) after repair.")
+        return recipe_json, errors
+    logger.info(f"{label} JSON repaired by patching {len(patch)} path(s).")
+    return repaired, []
+
+
+def _generate_validated(kind, label, generate_func, raw_text, usage=None):
+    """
+    Generates JSON, validates it against the compiled schema and, if it fails, tries a targeted repair
+    before falling back to one full regeneration. Output that is malformed or aborted mid-stream (None)
+    goes straight to the regeneration. The last result is returned even if still invalid.
+    """
+    generation_usage = {}
+    recipe_json = generate_func(raw_text, usage=generation_usage)
+    _merge_usage(usage, generation_usage)
+
+    if recipe_json is None:
+        logger.warning(f"{label} generation returned no usable JSON. Regenerating from scratch...")
+    else:
+        errors = recipe_schemas.validate(kind, recipe_json)
+        if not errors:
+            return recipe_json
+
+        repair_usage = {}
+        recipe_json, errors = repair_recipe(kind, label, recipe_json, errors, usage=repair_usage)
+        _merge_usage(usage, repair_usage)
+        if not errors:
+            logger.info(f"{label} repair used {repair_usage.get('repair', 0)} tokens vs {generation_usage.get('generation', 0)} for full generation.")
+            return recipe_json
+        logger.warning(f"Targeted repair of {label} JSON failed. Regenerating from scratch...")
+
+    regenerated = generate_func(raw_text, purpose="regeneration", usage=usage)
+    if regenerated is None:
+        return recipe_json
+    remaining_errors = recipe_schemas.validate(kind, regenerated)
+    if remaining_errors:
+        logger.error(f"Regenerated {label} JSON still fails schema validation: " + "; ".join(f"{path or '/'}: {message}" for path, message in remaining_errors))
+    return regenerated
+
+
+def _merge_usage(usage, call_usage):
+    if usage is not None:
+        for purpose, tokens in call_usage.items():
+            usage[purpose] = usage.get(purpose, 0) + tokens
+
+
+def run_llm_stage(raw_text, output_dir, file_name, send_notification_func=None, usage=None):
+    """
+    Generates both JSON formats from the raw text, validates and if needed repairs them, and saves them into output_dir.
+    Tokens spent are added per purpose to the optional usage dict.
+
+    Returns:
+        tuple: (schema_org_json, create_recipe_json); either may be None on failure.
+    """
+    logger.info("Generating Schema.org JSON...")
+    schema_org_json_output = _generate_validated(
+        recipe_schemas.SCHEMA_ORG, "Schema.org", llm_processor.get_schema_org_json, raw_text, usage=usage
+    )
+
+    if schema_org_json_output:
+        file_manager.save_json_file(schema_org_json_output, os.path.join(output_dir, SCHEMA_ORG_FILE))
+        logger.info(f"Successfully generated and saved Schema.org JSON.")
+    else:
+        logger.error("Failed to generate Schema.org JSON.")
+        if send_notification_func:
+            send_notification_func(f"ERROR: Failed to generate Schema.org JSON for '{file_name}'", title="Recipe Conversion Failed", priority=1)
+
+    logger.info("Generating createRecipe (intermediate) JSON...")
+    create_recipe_intermediate_json_output = _generate_validated(
+        recipe_schemas.CREATE_RECIPE, "createRecipe", llm_processor.get_create_recipe_json_intermediate, raw_text, usage=usage
+    )
+
+    if create_recipe_intermediate_json_output:
+        file_manager.save_json_file(create_recipe_intermediate_json_output, os.path.join(output_dir, CREATE_RECIPE_FILE))
+        logger.info(f"Successfully generated and saved createRecipe (intermediate) JSON.")
+    else:
+        logger.error(f"Failed to generate createRecipe (intermediate) JSON.")
+        if send_notification_func:
+            send_notification_func(f"ERROR: Failed to generate createRecipe JSON for '{file_name}'", title="Recipe Conversion Failed", priority=1)
+
+    return schema_org_json_output, create_recipe_intermediate_json_output
+
+
+def run_post_process_stage(output_dir, file_name, send_notification_func=None):
+    """Post-processes the createRecipe JSON in output_dir into PROCESSED_RECIPE_FILE. Returns True on success."""
+    logger.info("Starting post-processing for createRecipe JSON and anomaly checks...")
+    post_process_success = post_processor.post_process_create_recipe_json(
+        os.path.join(output_dir, CREATE_RECIPE_FILE),
+        send_notification_func=send_notification_func,
+        output_path=os.path.join(output_dir, PROCESSED_RECIPE_FILE)
+    )
+    if post_process_success:
+        logger.info("createRecipe JSON post-processing completed successfully.")
+    else:
+        logger.warning("createRecipe JSON post-processing encountered issues. Check logs for details.")
+        if send_notification_func:
+            send_notification_func(f"WARNING: Post-processing issues for '{file_name}'. Check logs!", title="Recipe Post-Processing Issue", priority=1)
+    return post_process_success
+
+
+def run_send_stage(output_dir, file_name, api_url, bearer_token, send_notification_func=None, usage=None):
+    """
+    Validates the post-processed createRecipe JSON in output_dir, repairing it if needed, and sends it
+    to the external API. Payloads that still fail validation are not sent. Returns True on success.
+    """
+    logger.info("Attempting to send processed createRecipe JSON to external API...")
+    # Load the JSON from disk again to ensure post-processing changes are included
+    create_recipe_path = os.path.join(output_dir, PROCESSED_RECIPE_FILE)
+    if not os.path.exists(create_recipe_path):
+        # Folders from before the LLM output was kept separately hold only the post-processed intermediate file
+        create_recipe_path = os.path.join(output_dir, CREATE_RECIPE_FILE)
+    loaded_processed_json = file_manager.load_json_file(create_recipe_path)
+
+    if loaded_processed_json:
+        errors = recipe_schemas.validate(recipe_schemas.CREATE_RECIPE, loaded_processed_json)
+        if errors:
+            loaded_processed_json, errors = repair_recipe(recipe_schemas.CREATE_RECIPE, "createRecipe", loaded_processed_json, errors, usage=usage)
+            if errors:
+                logger.error(f"createRecipe JSON for '{file_name}' fails schema validation. API send skipped.")
+                if send_notification_func:
+                    send_notification_func(f"ERROR: createRecipe JSON for '{file_name}' fails schema validation; not sent to API.", title="API Send Skipped", priority=1)
+                return False
+            file_manager.save_json_file(loaded_processed_json, create_recipe_path)
+
+    if loaded_processed_json: # Ensure file was loaded correctly
+        api_send_successful = api_sender.send_recipe_to_api(
+            recipe_json_data=loaded_processed_json,
+            api_url=api_url,
+            bearer_token=bearer_token,
+            send_notification_func=send_notification_func,
+            original_file_name=file_name
+        )
+    else:
+        api_send_successful = False # Set to False if loading failed
+        logger.error(f"Could not load post-processed JSON for '{file_name}' to send to API. API send skipped.")
+        if send_notification_func:
+            send_notification_func(f"ERROR: Could not load post-processed JSON for '{file_name}' to send to API.", title="API Send Skipped", priority=1)
+
+    if api_send_successful:
+        logger.info(f"Successfully sent '{file_name}' to external API.")
+    else:
+        logger.error(f"Failed to send '{file_name}' to external API. Check logs/Pushover for details.")
+    return api_send_successful
@@ -0,0 +1,178 @@
+# monitor_service/polling_watcher.py
+"""
+Polling watcher for input folders on network filesystems (NFS/SMB), where inotify never sees files
+written by other hosts.
+
+It keeps an incremental snapshot index (path -> size, mtime, inode) and, on each pass, only re-reads
+directories whose mtime changed, so the cost of a quiet pass is one stat per directory regardless of
+how many files the tree holds. Within a changed directory every file is stat'ed and compared with its
+indexed size, mtime and inode, so a file deleted and re-created under the same name between passes is
+seen even when the filesystem reuses its inode. New files are reported once their size and mtime have
+stopped changing, so a file that is still being copied is never handed to the pipeline. The scan interval shrinks to
+min_interval while files are arriving and backs off towards max_interval when the folder is idle.
+
+The class mirrors the schedule()/start()/stop()/join() interface of watchdog's Observer and
+dispatches watchdog FileCreatedEvents, so RecipeFileHandler works unchanged with either.
+"""
+import os
+import time
+import logging
+import threading
+
+from watchdog.events import FileCreatedEvent
+
+logger = logging.getLogger(__name__)
+
+# A directory whose mtime is this close to the time it was last read may have gained an entry within
+# the same mtime tick (coarse timestamps on some network filesystems), so it is read again next pass.
+RACY_WINDOW_NS = 2_000_000_000
+# A full pass re-reads every directory regardless of mtime, in case the share's attribute cache hid a change
+FULL_RESCAN_INTERVAL = 300
+BACKOFF_FACTOR = 1.5
+
+
+class PollingWatcher(threading.Thread):
+    def __init__(self, min_interval=1.0, max_interval=30.0):
+        super().__init__(name="polling-watcher", daemon=True)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._handler = None
+        self._root = None
+        self._recursive = False
+        self._stopped = threading.Event()
+        self._dirs = {}     # dir path -> (mtime_ns, time the dir was last read in ns)
+        self._entries = {}  # dir path -> {name: inode} of files and subdirectories seen in it
+        self._files = {}    # file path -> (size, mtime_ns, inode) of reported or pre-existing files
+        self._pending = {}  # file path -> (size, mtime_ns, inode) of new files waiting to stop changing
+        self._last_full_rescan = 0.0
+
+    def schedule(self, event_handler, path, recursive=False):
+        self._handler = event_handler
+        self._root = os.path.abspath(path)
+        self._recursive = recursive
+
+    def stop(self):
+        self._stopped.set()
+
+    def start(self):
+        # Files already present at startup are indexed but not reported, like the inotify Observer. This
+        # happens before start() returns, so anything that arrives afterwards (e.g. claims requeued right
+        # after the watcher starts) is reported as new instead of being absorbed into the initial snapshot.
+        self._read_dir(self._root, report_new=False)
+        self._last_full_rescan = time.monotonic()
+        logger.info(f"Polling watcher indexed {len(self._files)} file(s) in {len(self._dirs)} folder(s) under {self._root}.")
+        super().start()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                active = self.poll()
+            except Exception as e:
+                logger.exception(f"Polling watcher pass failed: {e}")
+                active = False
+            self.interval = self.min_interval if active else min(self.interval * BACKOFF_FACTOR, self.max_interval)
+
+    def poll(self):
+        """Runs one pass over the tree. Returns True if anything new or still-changing was seen."""
+        full_rescan = time.monotonic() - self._last_full_rescan >= FULL_RESCAN_INTERVAL
+        if full_rescan:
+            self._last_full_rescan = time.monotonic()
+
+        # Files found pending by the previous pass are checked first, so each has held still for a full interval
+        active = self._check_pending()
+        for dir_path in list(self._dirs):
+            if dir_path not in self._dirs: # Removed earlier in this pass along with its parent
+                continue
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except FileNotFoundError:
+                self._forget_dir(dir_path)
+                continue
+            last_mtime_ns, last_read_ns = self._dirs[dir_path]
+            if full_rescan or mtime_ns != last_mtime_ns or last_read_ns - mtime_ns < RACY_WINDOW_NS:
+                active |= self._read_dir(dir_path, report_new=True)
+        return active
+
+    def _read_dir(self, dir_path, report_new):
+        """Diffs one directory against the index. Returns True if it had new entries."""
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+            scanned = list(os.scandir(dir_path))
+        except FileNotFoundError:
+            self._forget_dir(dir_path)
+            return False
+        self._dirs[dir_path] = (mtime_ns, time.time_ns())
+
+        known = self._entries.get(dir_path, {})
+        current = {}
+        changed = False
+        for entry in scanned:
+            if entry.name.startswith("."): # Hidden files and folders (staging/claim areas, .DS_Store, ...)
+                continue
+            inode = entry.inode()
+            current[entry.name] = inode
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    # Known subdirectories are checked through their own mtime
+                    if self._recursive and known.get(entry.name) != inode:
+                        changed |= self._read_dir(entry.path, report_new)
+                    continue
+                if not entry.is_file() or (known.get(entry.name) == inode and entry.path in self._pending):
+                    continue # Pending files are re-checked by _check_pending
+                stat = entry.stat()
+            except FileNotFoundError:
+                current.pop(entry.name, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns, inode)
+            if self._files.get(entry.path) == signature:
+                continue # Unchanged since it was indexed or reported
+            if report_new:
+                # New, or replaced under a known name (possibly with a reused inode)
+                self._files.pop(entry.path, None)
+                self._pending[entry.path] = signature
+            else:
+                self._files[entry.path] = signature
+            changed = True
+
+        for name in known.keys() - current.keys():
+            removed_path = os.path.join(dir_path, name)
+            if removed_path in self._dirs:
+                self._forget_dir(removed_path)
+            self._files.pop(removed_path, None)
+            self._pending.pop(removed_path, None)
+        self._entries[dir_path] = current
+        return changed
+
+    def _check_pending(self):
+        """Reports pending files whose size and mtime held still for one interval. Returns True if any were pending."""
+        had_pending = bool(self._pending)
+        for path, signature in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            if current != signature:
+                self._pending[path] = current # Still being written
+                continue
+            del self._pending[path]
+            self._files[path] = current
+            self._dispatch(path)
+        return had_pending
+
+    def _dispatch(self, path):
+        try:
+            self._handler.dispatch(FileCreatedEvent(path))
+        except Exception as e:
+            logger.exception(f"Handler failed for {path}: {e}")
+
+    def _forget_dir(self, dir_path):
+        prefix = dir_path + os.sep
+        for path in [path for path in self._dirs if path == dir_path or path.startswith(prefix)]:
+            del self._dirs[path]
+            self._entries.pop(path, None)
+        for index in (self._files, self._pending):
+            for path in [path for path in index if path.startswith(prefix)]:
+                del index[path]
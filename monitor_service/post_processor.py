@@ -55,62 +55,79 @@ def check_ingredient_anomalies(recipe_data):
     return warnings
 
 
-def post_process_create_recipe_json(json_file_path, send_notification_func=None):
+def post_process_recipe_data(recipe_data, source_name, send_notification_func=None):
+    """
+    Applies the createRecipe post-processing rules to an already loaded recipe dict in place:
+    trims servings_text, defaults servings and raises anomaly warnings via notification.
+    Returns the same dict so callers can chain it.
+    """
+    recipe_name = recipe_data.get("name", "Unknown Recipe")
+
+    # 1. Process servings_text for character limit
+    if "servings_text" in recipe_data and recipe_data["servings_text"] is not None:
+        original_servings_text = str(recipe_data["servings_text"])
+        recipe_data["servings_text"] = original_servings_text # The LLM sometimes returns a bare number
+        if len(original_servings_text) > 32:
+            recipe_data["servings_text"] = "empty"
+            logger.info(f"Servings text '{original_servings_text}' exceeded 32 chars. Set to 'empty' for {source_name}")
+            if send_notification_func:
+                send_notification_func(
+                    message=f"Servings text for '{recipe_name}' too long (>32 chars). Set to 'empty'.",
+                    title="Recipe Anomaly: Servings Text",
+                    priority=0
+                )
+        else:
+            logger.debug(f"Servings text '{original_servings_text}' is within limits.")
+    else:
+        logger.debug(f"No servings_text found or it's null for {source_name}")
+
+    # --- NEW: Set servings to 1 if empty or null ---
+    # Check if 'servings' key exists and if its value is None.
+    # If the key doesn't exist, or if its value is None, or if it's an empty string/0 (interpret as empty)
+    if "servings" not in recipe_data or recipe_data["servings"] is None or \
+       (isinstance(recipe_data["servings"], (int, float)) and recipe_data["servings"] == 0) or \
+       (isinstance(recipe_data["servings"], str) and not recipe_data["servings"].strip()):
+
+        recipe_data["servings"] = 1
+        logger.info(f"Servings field was empty/null/zero for '{recipe_name}'. Defaulted to 1.")
+    elif isinstance(recipe_data["servings"], str) and recipe_data["servings"].strip().isdigit():
+        recipe_data["servings"] = int(recipe_data["servings"].strip()) # The API expects an integer
+    elif isinstance(recipe_data["servings"], float) and recipe_data["servings"].is_integer():
+        recipe_data["servings"] = int(recipe_data["servings"])
+    # --- END NEW ---
+
+    # 2. Check for ingredient anomalies (now on the first step's ingredients)
+    anomalies = check_ingredient_anomalies(recipe_data)
+    if anomalies:
+        logger.warning(f"Detected {len(anomalies)} potential ingredient anomalies for {source_name}")
+        if send_notification_func:
+            anomaly_title = f"Recipe Anomaly: '{recipe_name}'"
+            anomaly_message = f"Detected {len(anomalies)} potential ingredient anomaly(s) in:\n" + "\n".join(anomalies)
+            send_notification_func(
+                message=anomaly_message,
+                title=anomaly_title,
+                priority=1 # High priority for potential recipe issues
+            )
+    else:
+        logger.info(f"No ingredient anomalies detected for {source_name}")
+
+    return recipe_data
+
+
+def post_process_create_recipe_json(json_file_path, send_notification_func=None, output_path=None):
     """
     Reads the intermediate createRecipe JSON, modifies servings_text if needed,
     sets servings default, and adds anomaly warnings via notification.
+    The result is saved to output_path, or back to json_file_path if none is given.
     """
     try:
         with open(json_file_path, 'r', encoding='utf-8') as f:
             recipe_data = json.load(f)
 
-        recipe_name = recipe_data.get("name", "Unknown Recipe")
-
-        # 1. Process servings_text for character limit
-        if "servings_text" in recipe_data and recipe_data["servings_text"] is not None:
-            original_servings_text = str(recipe_data["servings_text"])
-            if len(original_servings_text) > 32:
-                recipe_data["servings_text"] = "empty"
-                logger.info(f"Servings text '{original_servings_text}' exceeded 32 chars. Set to 'empty' for {os.path.basename(json_file_path)}")
-                if send_notification_func:
-                    send_notification_func(
-                        message=f"Servings text for '{recipe_name}' too long (>32 chars). Set to 'empty'.",
-                        title="Recipe Anomaly: Servings Text",
-                        priority=0
-                    )
-            else:
-                logger.debug(f"Servings text '{original_servings_text}' is within limits.")
-        else:
-            logger.debug(f"No servings_text found or it's null for {os.path.basename(json_file_path)}")
-
-        # --- NEW: Set servings to 1 if empty or null ---
-        # Check if 'servings' key exists and if its value is None.
-        # If the key doesn't exist, or if its value is None, or if it's an empty string/0 (interpret as empty)
-        if "servings" not in recipe_data or recipe_data["servings"] is None or \
-           (isinstance(recipe_data["servings"], (int, float)) and recipe_data["servings"] == 0) or \
-           (isinstance(recipe_data["servings"], str) and not recipe_data["servings"].strip()):
-            
-            recipe_data["servings"] = 1
-            logger.info(f"Servings field was empty/null/zero for '{recipe_name}'. Defaulted to 1.")
-        # --- END NEW ---
-
-        # 2. Check for ingredient anomalies (now on the first step's ingredients)
-        anomalies = check_ingredient_anomalies(recipe_data)
-        if anomalies:
-            logger.warning(f"Detected {len(anomalies)} potential ingredient anomalies for {os.path.basename(json_file_path)}")
-            if send_notification_func:
-                anomaly_title = f"Recipe Anomaly: '{recipe_name}'"
-                anomaly_message = f"Detected {len(anomalies)} potential ingredient anomaly(s) in:\n" + "\n".join(anomalies)
-                send_notification_func(
-                    message=anomaly_message,
-                    title=anomaly_title,
-                    priority=1 # High priority for potential recipe issues
-                )
-        else:
-            logger.info(f"No ingredient anomalies detected for {os.path.basename(json_file_path)}")
+        post_process_recipe_data(recipe_data, os.path.basename(json_file_path), send_notification_func)
 
-        # Save the modified JSON back to the same path
-        with open(json_file_path, 'w', encoding='utf-8') as f:
+        # Save the modified JSON (back to the same path unless an output path was given)
+        with open(output_path or json_file_path, 'w', encoding='utf-8') as f:
             json.dump(recipe_data, f, indent=2, ensure_ascii=False)
         
         logger.info(f"Post-processing complete for {os.path.basename(json_file_path)}")
@@ -0,0 +1,213 @@
+# monitor_service/recipe_schemas.py
+"""
+JSON schemas for both LLM output formats, compiled once into validators on first use
+(or ahead of time by warm_up(), which the monitor runs in the background at startup).
+
+validate() returns every failure as a (JSON Pointer path, message) pair so a repair prompt can
+target just the failing parts; apply_patch() applies the model's path -> value corrections.
+"""
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_ORG = "schema_org"
+CREATE_RECIPE = "create_recipe"
+
+SCHEMA_ORG_SCHEMA = {
+    "type": "object",
+    "required": ["@context", "@type", "name", "recipeIngredient", "recipeInstructions"],
+    "properties": {
+        "@context": {"type": "string"},
+        "@type": {"const": "Recipe"},
+        "name": {"type": "string", "minLength": 1},
+        "recipeIngredient": {"type": "array", "items": {"type": "string"}},
+        "recipeInstructions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["@type", "text"],
+                "properties": {
+                    "@type": {"const": "HowToStep"},
+                    "text": {"type": "string", "minLength": 1},
+                },
+            },
+        },
+        "prepTime": {"type": "string", "pattern": "^P"},
+        "cookTime": {"type": "string", "pattern": "^P"},
+        "totalTime": {"type": "string", "pattern": "^P"},
+        "recipeYield": {"type": ["string", "number"]},
+    },
+}
+
+_NAMED_ENTITY = {
+    "type": "object",
+    "required": ["name"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "plural_name": {"type": ["string", "null"]},
+    },
+}
+
+CREATE_RECIPE_SCHEMA = {
+    "type": "object",
+    "required": ["name", "steps"],
+    "properties": {
+        "name": {"type": "string", "minLength": 1},
+        "description": {"type": ["string", "null"]},
+        "keywords": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["name"],
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "description": {"type": ["string", "null"]},
+                },
+            },
+        },
+        "steps": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["name", "instruction"],
+                "properties": {
+                    "name": {"type": "string"},
+                    "instruction": {"type": "string", "minLength": 1},
+                    "ingredients": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["food", "unit", "amount"],
+                            "properties": {
+                                "food": _NAMED_ENTITY,
+                                "unit": _NAMED_ENTITY,
+                                "amount": {"type": "number", "minimum": 0},
+                                "note": {"type": ["string", "null"]},
+                            },
+                        },
+                    },
+                    "time": {"type": "integer", "minimum": 0},
+                    "order": {"type": "integer", "minimum": 0},
+                    "show_as_header": {"type": "boolean"},
+                    "show_ingredients_table": {"type": "boolean"},
+                },
+            },
+        },
+        "working_time": {"type": "integer", "minimum": 0},
+        "waiting_time": {"type": "integer", "minimum": 0},
+        "source_url": {"type": ["string", "null"]},
+        "nutrition": {
+            "type": "object",
+            "properties": {
+                field: {"type": ["string", "number", "null"]}
+                for field in ("carbohydrates", "fats", "proteins", "calories", "source")
+            },
+        },
+        # null/0/"" are allowed here because post-processing defaults them to 1, and whole-number strings
+        # and floats because it converts them to integers; the streaming type check accepts the same types
+        "servings": {"type": ["number", "string", "null"], "minimum": 0, "multipleOf": 1, "pattern": r"^\s*\d*\s*$"},
+        "servings_text": {"type": ["string", "number", "null"]}, # post_processor turns numbers into text
+    },
+}
+
+# Compiled once, then reused for every recipe
+_validators = None
+_validators_lock = threading.Lock()
+
+
+def _get_validators():
+    global _validators
+    if _validators is None:
+        with _validators_lock:
+            if _validators is None:
+                from jsonschema import Draft7Validator
+
+                for schema in (SCHEMA_ORG_SCHEMA, CREATE_RECIPE_SCHEMA):
+                    Draft7Validator.check_schema(schema)
+                _validators = {
+                    SCHEMA_ORG: Draft7Validator(SCHEMA_ORG_SCHEMA),
+                    CREATE_RECIPE: Draft7Validator(CREATE_RECIPE_SCHEMA),
+                }
+    return _validators
+
+
+def warm_up():
+    """Compiles the validators ahead of the first recipe."""
+    _get_validators()
+
+
+def _to_pointer(path):
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in path)
+
+
+def _parse_pointer(pointer):
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON Pointer: {pointer!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def validate(kind, recipe_json):
+    """
+    Validates recipe_json against the compiled schema for kind (SCHEMA_ORG or CREATE_RECIPE).
+
+    Returns:
+        list: (json_pointer_path, message) tuples, sorted by path; empty if the recipe is valid.
+    """
+    errors = _get_validators()[kind].iter_errors(recipe_json)
+    return sorted((_error_pointer(error), error.message) for error in errors)
+
+
+def _error_pointer(error):
+    """The path of a validation error; for a missing required property, the path of that property rather than its parent."""
+    pointer = _to_pointer(error.absolute_path)
+    if error.validator == "required" and isinstance(error.instance, dict):
+        for name in error.validator_value:
+            if name not in error.instance and error.message.startswith(repr(name)):
+                return _to_pointer([*error.absolute_path, name])
+    return pointer
+
+
+def resolve_pointer(data, pointer):
+    """Returns the value at a JSON Pointer path. Raises KeyError/IndexError/TypeError if it doesn't exist."""
+    value = data
+    for part in _parse_pointer(pointer) if pointer else []:
+        value = value[int(part)] if isinstance(value, list) else value[part]
+    return value
+
+
+def _removal_order(pointer):
+    return [int(part) if part.isdigit() else -1 for part in pointer.split("/")]
+
+
+def apply_patch(data, patch):
+    """
+    Returns a copy of data with each JSON Pointer path in patch set to its value.
+    A null value removes the field. Paths that don't fit the document are skipped with a warning.
+    """
+    patched = copy.deepcopy(data)
+    # Removals go last and from the highest path down, so deleting list items doesn't shift later indices
+    removals = sorted((pointer for pointer, value in patch.items() if value is None), key=_removal_order, reverse=True)
+    updates = [pointer for pointer, value in patch.items() if value is not None]
+    for pointer in updates + removals:
+        value = patch[pointer]
+        try:
+            *parents, last = _parse_pointer(pointer)
+            target = resolve_pointer(patched, _to_pointer(parents))
+            if isinstance(target, list):
+                index = int(last)
+                if value is None:
+                    del target[index]
+                elif index == len(target):
+                    target.append(value)
+                else:
+                    target[index] = value
+            elif value is None:
+                target.pop(last, None)
+            else:
+                target[last] = value
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            logger.warning(f"Skipping repair for path '{pointer}': {e}")
+    return patched
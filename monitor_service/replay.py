@@ -0,0 +1,233 @@
+# monitor_service/replay.py
+"""
+Re-runs the pipeline from a given stage using the artifacts already stored in output folders,
+so prompt or post-processing changes can be tried without re-dropping files or paying for OCR again.
+
+Usage (inside the monitor container):
+    python replay.py --from-stage llm --dry-run                 # diff new LLM output for every folder
+    python replay.py --from-stage post_process 2025-06-16_112721
+    python replay.py --from-stage send --workers 8 /app/output/2025-06-16_112721
+"""
+import os
+import sys
+import shutil
+import difflib
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import notifier
+import pipeline
+import job_index
+import file_manager
+
+load_dotenv()
+
+OUTPUT_DIR = "/app/output"
+API_ENDPOINT = os.getenv("API_ENDPOINT", "http://192.168.68.62:8002/api/recipe/")
+API_BEARER_TOKEN = os.getenv("API_BEARER_TOKEN")
+
+# Artifacts compared in --dry-run mode, in the order the diff is printed
+DIFFED_ARTIFACTS = (pipeline.SCHEMA_ORG_FILE, pipeline.CREATE_RECIPE_FILE, pipeline.PROCESSED_RECIPE_FILE)
+# Job index artifact keys of the JSON files in an output folder
+JSON_ARTIFACTS = (
+    ("create_recipe", pipeline.CREATE_RECIPE_FILE),
+    ("processed_recipe", pipeline.PROCESSED_RECIPE_FILE),
+    ("schema_org", pipeline.SCHEMA_ORG_FILE),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def find_output_folders(output_dir):
+    """Returns every output subfolder that holds a saved raw OCR text, oldest first."""
+    folders = []
+    for entry in sorted(os.scandir(output_dir), key=lambda e: e.name):
+        if entry.is_dir() and pipeline.find_raw_text_file(entry.path):
+            folders.append(entry.path)
+    return folders
+
+
+def resolve_folder(folder, output_dir):
+    """Accepts either a full path or a folder name relative to output_dir."""
+    if os.path.isdir(folder):
+        return folder
+    return os.path.join(output_dir, folder)
+
+
+def diff_artifacts(old_dir, new_dir):
+    """Returns a unified diff of the JSON artifacts between two output folders."""
+    diff_lines = []
+    for artifact in DIFFED_ARTIFACTS:
+        old_path = os.path.join(old_dir, artifact)
+        new_path = os.path.join(new_dir, artifact)
+        old_lines = _read_lines(old_path)
+        new_lines = _read_lines(new_path)
+        diff_lines.extend(difflib.unified_diff(old_lines, new_lines, fromfile=f"old/{artifact}", tofile=f"new/{artifact}"))
+    return "".join(diff_lines)
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+
+def _load_artifact(work_dir, artifact):
+    path = os.path.join(work_dir, artifact)
+    return file_manager.load_json_file(path) if os.path.exists(path) else None
+
+
+def run_stages(from_stage, work_dir, file_name, send=True, send_notification_func=None, usage=None):
+    """
+    Runs from_stage and every later stage against the artifacts in work_dir. Tokens spent are added per
+    purpose to the optional usage dict.
+
+    Returns:
+        bool: The job's outcome by the same rule as the live monitor (pipeline.job_succeeded). With send=False,
+        a createRecipe JSON that was post-processed counts as sent.
+    """
+    stages = pipeline.STAGES[pipeline.STAGES.index(from_stage):]
+
+    if "llm" in stages:
+        raw_text_path = pipeline.find_raw_text_file(work_dir)
+        with open(raw_text_path, 'r', encoding='utf-8') as f:
+            raw_text = f.read()
+        schema_org_json, create_recipe_json = pipeline.run_llm_stage(raw_text, work_dir, file_name, send_notification_func, usage=usage)
+    else:
+        schema_org_json = _load_artifact(work_dir, pipeline.SCHEMA_ORG_FILE)
+        create_recipe_json = _load_artifact(work_dir, pipeline.CREATE_RECIPE_FILE)
+
+    ready_to_send = bool(create_recipe_json)
+    if ready_to_send and "post_process" in stages:
+        ready_to_send = pipeline.run_post_process_stage(work_dir, file_name, send_notification_func)
+
+    api_send_successful = False
+    if ready_to_send:
+        if send:
+            api_send_successful = pipeline.run_send_stage(work_dir, file_name, API_ENDPOINT, API_BEARER_TOKEN, send_notification_func, usage=usage)
+        else:
+            api_send_successful = True
+
+    return pipeline.job_succeeded(schema_org_json, create_recipe_json, api_send_successful)
+
+
+def update_job_index(db_path, folder, from_stage, success, usage):
+    """Brings the folder's job index row in line with the replayed artifacts. Folders that aren't indexed are skipped."""
+    job_id = os.path.basename(os.path.normpath(folder))
+    job = job_index.get_job(db_path, job_id) if os.path.exists(db_path) else None
+    if job is None:
+        return
+
+    artifacts = {"raw_ocr": pipeline.find_raw_text_file(folder)}
+    recipe_name = None
+    for key, artifact in JSON_ARTIFACTS:
+        artifact_path = os.path.join(folder, artifact)
+        if os.path.exists(artifact_path):
+            artifacts[key] = artifact_path
+            recipe_name = recipe_name or (file_manager.load_json_file(artifact_path) or {}).get("name")
+
+    # Regenerating replaces the job's token usage; replaying later stages adds any repair tokens they spent
+    token_usage = {} if from_stage == "llm" else dict(job["token_usage"])
+    for purpose, tokens in usage.items():
+        token_usage[purpose] = token_usage.get(purpose, 0) + tokens
+
+    job_index.update_job(
+        db_path, job_id,
+        recipe_name=recipe_name,
+        status=job_index.STATUS_SUCCESS if success else job_index.STATUS_FAILED,
+        message=f"Replayed from stage '{from_stage}'",
+        finished_at=datetime.now().isoformat(timespec="seconds"),
+        artifacts=artifacts,
+        token_usage=token_usage,
+    )
+
+
+def replay_folder(folder, from_stage, dry_run=False, send_notification_func=None, job_index_db=None):
+    """
+    Replays one output folder from from_stage.
+
+    In dry-run mode the stages run against a temporary copy of the folder, nothing is sent to the API,
+    and the returned diff shows how the new artifacts differ from the stored ones. Otherwise the folder's
+    row in the job index at job_index_db (if given) is updated with the new outcome.
+
+    Returns:
+        tuple: (success, diff_text)
+    """
+    raw_text_path = pipeline.find_raw_text_file(folder)
+    if not raw_text_path:
+        logger.error(f"No raw OCR text found in {folder}. Cannot replay.")
+        return False, ""
+    file_name = os.path.basename(raw_text_path)[:-len(pipeline.RAW_OCR_SUFFIX)]
+
+    if not dry_run:
+        logger.info(f"Replaying '{folder}' from stage '{from_stage}'...")
+        usage = {}
+        success = run_stages(from_stage, folder, file_name, send_notification_func=send_notification_func, usage=usage)
+        if job_index_db:
+            update_job_index(job_index_db, folder, from_stage, success, usage)
+        return success, ""
+
+    with tempfile.TemporaryDirectory(prefix="replay_") as work_dir:
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                shutil.copy2(entry.path, work_dir)
+        logger.info(f"Dry-run replay of '{folder}' from stage '{from_stage}'...")
+        success = run_stages(from_stage, work_dir, file_name, send=False)
+        return success, diff_artifacts(folder, work_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the recipe pipeline from stored output artifacts.")
+    parser.add_argument("folders", nargs="*", help="Output folders to replay (names or paths). Defaults to every folder in --output-dir.")
+    parser.add_argument("--from-stage", choices=pipeline.STAGES, required=True, help="Stage to restart from; all later stages run too.")
+    parser.add_argument("--dry-run", action="store_true", help="Run in a scratch copy, never send to the API, and print a diff against the stored output.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of folders replayed in parallel.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Root output directory.")
+    parser.add_argument("--notify", action="store_true", help="Send Pushover notifications as the live pipeline does.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+
+    if args.folders:
+        folders = [resolve_folder(folder, args.output_dir) for folder in args.folders]
+    else:
+        folders = find_output_folders(args.output_dir)
+    if not folders:
+        logger.warning(f"No output folders to replay in {args.output_dir}.")
+        return 0
+
+    send_notification_func = notifier.send_pushover_notification if args.notify and not args.dry_run else None
+    job_index_db = os.path.join(args.output_dir, job_index.DB_FILE_NAME)
+    logger.info(f"Replaying {len(folders)} folder(s) from stage '{args.from_stage}' with {args.workers} worker(s){' (dry run)' if args.dry_run else ''}.")
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="replay") as executor:
+        futures = {
+            executor.submit(replay_folder, folder, args.from_stage, args.dry_run, send_notification_func, job_index_db): folder
+            for folder in folders
+        }
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                success, diff_text = future.result()
+            except Exception as e:
+                logger.exception(f"Replay of '{folder}' failed: {e}")
+                success, diff_text = False, ""
+            if not success:
+                failures += 1
+            if args.dry_run:
+                # Print each folder's diff as one block so parallel workers don't interleave
+                print(f"=== {folder}: {'OK' if success else 'FAILED'} ===\n{diff_text or '(no changes)'}", flush=True)
+
+    logger.info(f"Replay finished: {len(folders) - failures} succeeded, {failures} failed.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# monitor_service/segmentation.py
+"""
+Layout-aware splitting of pages that hold several recipes (cookbook pages, magazine spreads).
+
+Works on the full_text_annotation returned by Vision AI document text detection. Each text block is
+reduced to its text, bounding box and typical word height. Blocks are then put in reading order:
+blocks spanning most of the page width (page titles, full-width headings) cut the page into
+horizontal bands, and inside a band blocks are grouped into columns by horizontal overlap and read
+column by column, top to bottom.
+
+A block is taken as a recipe title if it is short, set in a larger font or in capitals, and is
+followed by recipe content (ingredient lines or an "Ingredients" heading). A new region starts at
+such a title only once the current region is a whole recipe, i.e. ingredients followed by method content
+(a method heading, numbered steps or sentences), and only if the title is set at least as large as the
+current recipe's own title. Page headers and intros therefore stay with the first recipe, and smaller
+component headings ("Pastry" under "LEMON TART") stay with their recipe. A component heading set as
+large as the recipe title, with its own ingredients after the recipe's method, is indistinguishable from
+a new recipe and still splits, which is why the monitor's SPLIT_MULTI_RECIPE_PAGES is off by default.
+Trailing regions without recipe content (footers, page numbers) are merged back into the region before them.
+"""
+import re
+import logging
+import statistics
+
+logger = logging.getLogger(__name__)
+
+# Vision AI detected break types (google.cloud.vision TextAnnotation.DetectedBreak.BreakType)
+BREAK_SPACE = 1
+BREAK_SURE_SPACE = 2
+BREAK_EOL_SURE_SPACE = 3
+BREAK_HYPHEN = 4
+BREAK_LINE_BREAK = 5
+
+SPANNING_WIDTH_RATIO = 0.6 # Blocks wider than this share of the text area are read as full-width
+COLUMN_OVERLAP_RATIO = 0.5 # Share of the narrower width two blocks must overlap to be in one column
+HEADING_HEIGHT_RATIO = 1.3 # Word height, relative to the page's body text, that marks a heading
+HEADING_MAX_WORDS = 10
+HEADING_MAX_LINES = 3
+HEADING_LOOKAHEAD_BLOCKS = 4 # How far after a heading to look for ingredients
+TITLE_HEIGHT_TOLERANCE = 0.9 # Share of the current recipe title's word height a new title needs (OCR box noise)
+
+QUANTITY_RE = re.compile(r"^\s*(?:[-•*▢□]\s*)?(?:\d+(?:[.,/]\d+)?|[½⅓⅔¼¾⅛⅜⅝⅞])")
+UNIT_RE = re.compile(
+    r"\b(?:cups?|tbsp|tbs|tablespoons?|tsp|teaspoons?|g|kg|grams?|ml|l|litres?|liters?|oz|ounces?|lbs?|pounds?|"
+    r"pinch|cloves?|handful|sprigs?|cans?|tins?|sticks?)\b", re.IGNORECASE)
+SECTION_RE = re.compile(r"^\s*(?:ingredients|method|directions|instructions|preparation|to serve|serves|makes|for the)\b", re.IGNORECASE)
+INGREDIENTS_HEADING_RE = re.compile(r"^\s*ingredients\b", re.IGNORECASE)
+METHOD_HEADING_RE = re.compile(r"^\s*(?:method|directions|instructions|preparation)\b", re.IGNORECASE)
+STEP_RE = re.compile(r"^\s*(?:step\s*)?\d+[.):]\s+\w", re.IGNORECASE)
+SENTENCE_MIN_WORDS = 6 # A non-ingredient line this long is read as method text
+
+
+class TextBlock:
+    def __init__(self, text, x0, y0, x1, y1, word_height):
+        self.text = text
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.word_height = word_height # Median word height: a proxy for font size
+        self.lines = [line for line in text.splitlines() if line.strip()]
+
+    @property
+    def width(self):
+        return self.x1 - self.x0
+
+
+def _box(bounding_box):
+    xs = [vertex.x for vertex in bounding_box.vertices]
+    ys = [vertex.y for vertex in bounding_box.vertices]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _block_text(block):
+    """Rebuilds a block's text from its symbols, keeping Vision's line breaks."""
+    parts = []
+    for paragraph in block.paragraphs:
+        for word in paragraph.words:
+            for symbol in word.symbols:
+                parts.append(symbol.text)
+                break_type = symbol.property.detected_break.type_
+                if break_type in (BREAK_SPACE, BREAK_SURE_SPACE):
+                    parts.append(" ")
+                elif break_type == BREAK_HYPHEN:
+                    parts.append("-\n")
+                elif break_type in (BREAK_EOL_SURE_SPACE, BREAK_LINE_BREAK):
+                    parts.append("\n")
+    return "".join(parts).strip()
+
+
+def blocks_from_annotation(annotation):
+    """Returns the text blocks of each page of a Vision AI full_text_annotation, as a list per page."""
+    pages = []
+    for page in annotation.pages:
+        blocks = []
+        for block in page.blocks:
+            text = _block_text(block)
+            if not text:
+                continue
+            word_heights = []
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    _, y0, _, y1 = _box(word.bounding_box)
+                    word_heights.append(y1 - y0)
+            blocks.append(TextBlock(text, *_box(block.bounding_box), statistics.median(word_heights) if word_heights else 0))
+        pages.append(blocks)
+    return pages
+
+
+def _columns(blocks):
+    """Groups blocks into columns by horizontal overlap. Returns the columns left to right, each top to bottom."""
+    columns = [] # [x0, x1, blocks]
+    for block in sorted(blocks, key=lambda b: b.x0):
+        for column in columns:
+            overlap = min(column[1], block.x1) - max(column[0], block.x0)
+            if overlap >= COLUMN_OVERLAP_RATIO * max(min(column[1] - column[0], block.width), 1):
+                column[0], column[1] = min(column[0], block.x0), max(column[1], block.x1)
+                column[2].append(block)
+                break
+        else:
+            columns.append([block.x0, block.x1, [block]])
+    return [sorted(column[2], key=lambda b: b.y0) for column in sorted(columns, key=lambda c: c[0])]
+
+
+def reading_order(blocks):
+    """Orders one page's blocks for reading: full-width blocks split the page into bands, each band read column by column."""
+    if not blocks:
+        return []
+    text_width = max(block.x1 for block in blocks) - min(block.x0 for block in blocks)
+    ordered = []
+    band = []
+    for block in sorted(blocks, key=lambda b: b.y0):
+        if block.width > SPANNING_WIDTH_RATIO * text_width:
+            for column in _columns(band):
+                ordered.extend(column)
+            band = []
+            ordered.append(block)
+        else:
+            band.append(block)
+    for column in _columns(band):
+        ordered.extend(column)
+    return ordered
+
+
+def _is_ingredient_line(line):
+    return bool(QUANTITY_RE.match(line)) or bool(UNIT_RE.search(line) and re.search(r"\d", line))
+
+
+def _has_recipe_content(blocks):
+    return any(INGREDIENTS_HEADING_RE.match(line) or _is_ingredient_line(line) for block in blocks for line in block.lines)
+
+
+def _has_method_content(blocks):
+    """True if method text (a method heading, numbered steps or sentences) follows the first ingredient line."""
+    seen_ingredients = False
+    for block in blocks:
+        for line in block.lines:
+            if seen_ingredients and (METHOD_HEADING_RE.match(line) or STEP_RE.match(line)):
+                return True
+            if _is_ingredient_line(line) or INGREDIENTS_HEADING_RE.match(line):
+                seen_ingredients = True
+            elif seen_ingredients and len(line.split()) >= SENTENCE_MIN_WORDS:
+                return True
+    return False
+
+
+def _looks_like_heading(block, body_height):
+    """Short, emphasized text that isn't an ingredient line or a section label such as 'Method'."""
+    if not block.lines or len(block.lines) > HEADING_MAX_LINES or len(block.text.split()) > HEADING_MAX_WORDS:
+        return False
+    if any(_is_ingredient_line(line) or SECTION_RE.match(line) for line in block.lines):
+        return False
+    text = " ".join(block.lines)
+    letters = [char for char in text if char.isalpha()]
+    if not letters or text.rstrip().endswith((".", ",", ";")): # Page numbers, sentences
+        return False
+    height_ratio = block.word_height / body_height if body_height else 1.0
+    is_caps = all(char.isupper() for char in letters)
+    is_title = all(word[0].isupper() for word in text.split() if word[0].isalpha() and len(word) > 3)
+    return height_ratio >= HEADING_HEIGHT_RATIO or (is_caps and len(letters) > 3) or (is_title and height_ratio >= 1.15)
+
+
+def split_regions(ordered):
+    """Splits blocks in reading order into recipe regions. Returns a list of block lists."""
+    heights = [block.word_height for block in ordered if block.word_height > 0]
+    body_height = statistics.median(heights) if heights else 0
+    headings = [_looks_like_heading(block, body_height) for block in ordered]
+
+    regions = [[]]
+    title_height = 0 # Word height of the current region's title: its last heading before any recipe content
+    for index, block in enumerate(ordered):
+        if (headings[index] and block.word_height >= TITLE_HEIGHT_TOLERANCE * title_height
+                and _has_recipe_content(regions[-1]) and _has_method_content(regions[-1])):
+            # Only a title as prominent as the current one, after a complete recipe and followed by its
+            # own ingredients, starts a new recipe
+            following = []
+            for next_index in range(index + 1, min(index + 1 + HEADING_LOOKAHEAD_BLOCKS, len(ordered))):
+                if headings[next_index]:
+                    break
+                following.append(ordered[next_index])
+            if _has_recipe_content(following):
+                regions.append([])
+        if headings[index] and not _has_recipe_content(regions[-1]):
+            title_height = block.word_height
+        regions[-1].append(block)
+
+    # Footers and other stray trailing text belong to the recipe before them
+    merged = []
+    for region in regions:
+        if merged and not _has_recipe_content(region):
+            merged[-1].extend(region)
+        else:
+            merged.append(region)
+    return merged
+
+
+def split_recipes(annotation):
+    """
+    Splits the text of a Vision AI full_text_annotation into one text per recipe.
+
+    Returns:
+        list: The region texts in reading order, or [annotation.text] if the page holds a single recipe.
+    """
+    regions = []
+    for page_blocks in blocks_from_annotation(annotation):
+        regions.extend(split_regions(reading_order(page_blocks)))
+    regions = [region for region in regions if region]
+    if len(regions) < 2:
+        return [annotation.text]
+
+    logger.info(f"Page split into {len(regions)} recipe regions: " + "; ".join(repr(region[0].lines[0]) for region in regions))
+    return ["\n".join(block.text for block in region) for region in regions]
@@ -0,0 +1,107 @@
+# monitor_service/startup_benchmark.py
+"""
+Measures monitor cold-start cost: how long the monitor's imports take before the watcher can start,
+how long the background warm-up of the heavy SDK clients takes, and (with --sample-file) the latency
+of processing a first file in a fresh process.
+
+Every run happens in a new Python process so imports are genuinely cold.
+
+Usage (inside the monitor container):
+    python startup_benchmark.py --runs 5
+    python startup_benchmark.py --sample-file /app/archive/SUCCESS_recipe.jpg   # calls Vision and Gemini
+"""
+import os
+import ast
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+MONITOR_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor.py")
+
+
+def monitor_imports():
+    """Modules monitor.py imports at top level, read from its source so this list can't fall behind it."""
+    with open(MONITOR_SOURCE, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return modules
+
+
+def _child(sample_file=None):
+    """Runs one cold-start measurement in this (fresh) process and prints the timings as JSON."""
+    import importlib
+    import logging
+    import tempfile
+
+    logging.basicConfig(level=logging.WARNING)
+    timings = {}
+
+    module_names = monitor_imports() # Parsed before the clock starts
+    started = time.perf_counter()
+    for module_name in module_names:
+        importlib.import_module(module_name)
+    timings["import_seconds"] = time.perf_counter() - started
+
+    import ocr_utils
+    import pipeline
+
+    if sample_file:
+        # First file on a cold process: pays for lazy SDK initialization inside the job
+        started = time.perf_counter()
+        extract_text = ocr_utils.extract_text_from_pdf if sample_file.lower().endswith(".pdf") else ocr_utils.extract_text_from_image
+        raw_text = extract_text(sample_file)
+        timings["first_file_ocr_seconds"] = time.perf_counter() - started
+        with tempfile.TemporaryDirectory(prefix="startup_benchmark_") as output_dir:
+            pipeline.run_llm_stage(raw_text, output_dir, os.path.basename(sample_file))
+        timings["first_file_seconds"] = time.perf_counter() - started
+    else:
+        import llm_processor
+        import recipe_schemas
+
+        # What the background warm-up thread costs once the watcher is live
+        for name, warm_up in (("vision_pdfminer", ocr_utils.warm_up), ("gemini", llm_processor.warm_up), ("schemas", recipe_schemas.warm_up)):
+            started = time.perf_counter()
+            warm_up()
+            timings[f"warm_up_{name}_seconds"] = time.perf_counter() - started
+
+    print(json.dumps(timings))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark monitor import time and first-file latency.")
+    parser.add_argument("--runs", type=int, default=3, help="Number of fresh processes to measure.")
+    parser.add_argument("--sample-file", help="Image or PDF to process as the first file (calls Vision and Gemini).")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.sample_file)
+        return 0
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.abspath(__file__), "--child"]
+    if args.sample_file:
+        command += ["--sample-file", args.sample_file]
+
+    results = []
+    for _ in range(max(1, args.runs)):
+        completed = subprocess.run(command, cwd=here, capture_output=True, text=True, check=True)
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"{'metric':<36}{'min':>10}{'median':>10}{'max':>10}")
+    for metric in results[0]:
+        values = [result[metric] for result in results]
+        print(f"{metric:<36}{min(values):>10.3f}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
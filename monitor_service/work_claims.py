@@ -0,0 +1,176 @@
+# monitor_service/work_claims.py
+"""
+Lease-based work claiming so several monitor instances can share one input folder.
+
+A node claims a file by atomically renaming it into its own claim directory,
+INPUT_DIR/.claims/<node_id>/. rename() is atomic on the same filesystem (including NFS), so exactly
+one node wins; the others get FileNotFoundError and skip the file. The claimed file is then
+processed and archived from the claim directory.
+
+Each node keeps a lease on its claim directory by touching a heartbeat file. If a node stops
+heartbeating for longer than the lease, any other node moves that node's claimed files back into
+the input folder, where they are picked up again. Heartbeat ages are compared against this node's
+own freshly touched heartbeat, i.e. both timestamps come from the file server's clock, so clock skew
+between hosts doesn't expire leases early.
+
+A node whose lease expired while it was still alive (a share outage, a paused container) finds its
+claim directory gone; it re-registers on its next heartbeat or claim. Files it was working on may
+meanwhile be processed by another node, so the monitor checks holds() before sending a recipe to the
+API and before archiving, and drops the job if the claim was lost.
+"""
+import os
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CLAIMS_DIR_NAME = ".claims"
+HEARTBEAT_FILE_NAME = ".heartbeat"
+
+
+class ClaimManager:
+    def __init__(self, input_dir, node_id=None, lease_seconds=120, heartbeat_interval=30):
+        self.input_dir = input_dir
+        self.node_id = node_id or socket.gethostname()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.claims_root = os.path.join(input_dir, CLAIMS_DIR_NAME)
+        self.claim_dir = os.path.join(self.claims_root, self.node_id)
+        self._heartbeat_path = os.path.join(self.claim_dir, HEARTBEAT_FILE_NAME)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._in_progress = set() # Names claimed by this node and not yet released
+        self._in_progress_lock = threading.Lock()
+
+    def start(self):
+        """Creates this node's claim directory, requeues its leftovers from a previous run and starts heartbeating."""
+        os.makedirs(self.claim_dir, exist_ok=True)
+        self.heartbeat()
+        # Anything still in our own claim directory was being processed when this node last stopped
+        requeued = self._requeue_claims(self.claim_dir)
+        if requeued:
+            logger.info(f"Requeued {requeued} file(s) left claimed by this node ('{self.node_id}') before restart.")
+        self._thread = threading.Thread(target=self._run, name="claim-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Work claiming enabled for node '{self.node_id}' (lease {self.lease_seconds}s).")
+
+    def stop(self):
+        self._stopped.set()
+
+    def claim(self, file_path):
+        """
+        Atomically moves file_path into this node's claim directory.
+
+        Returns:
+            str: The claimed path, or None if another node claimed the file first.
+        """
+        file_name = os.path.basename(file_path)
+        claimed_path = os.path.join(self.claim_dir, file_name)
+        with self._in_progress_lock:
+            if file_name in self._in_progress or os.path.exists(claimed_path):
+                # rename() would silently replace it; a same-named file is already in progress here
+                logger.warning(f"'{file_name}' is already claimed by this node. Skipping duplicate.")
+                return None
+            self._in_progress.add(file_name)
+
+        claimed = False
+        for attempt in range(2):
+            try:
+                os.rename(file_path, claimed_path)
+                claimed = True
+                break
+            except FileNotFoundError:
+                if attempt == 0 and not os.path.isdir(self.claim_dir):
+                    # The destination is missing, not the file: another node expired our lease and removed our directory
+                    try:
+                        self.heartbeat()
+                        continue
+                    except OSError as e:
+                        logger.error(f"Failed to re-register node '{self.node_id}': {e}")
+                        break
+                logger.info(f"'{file_name}' was claimed by another node. Skipping.")
+                break
+            except OSError as e:
+                logger.error(f"Failed to claim '{file_name}': {e}")
+                break
+        if not claimed:
+            self.release(claimed_path)
+            return None
+        logger.info(f"Claimed '{file_name}' for node '{self.node_id}'.")
+        return claimed_path
+
+    def holds(self, claimed_path):
+        """
+        True if claimed_path is still in this node's claim directory. False once the lease expired and
+        another node requeued the file, in which case this node must not send or archive it.
+        """
+        return os.path.dirname(claimed_path) == self.claim_dir and os.path.exists(claimed_path)
+
+    def release(self, claimed_path):
+        """Marks a claimed file as finished so a file of the same name can be claimed again."""
+        with self._in_progress_lock:
+            self._in_progress.discard(os.path.basename(claimed_path))
+
+    def heartbeat(self):
+        """
+        Renews this node's lease, recreating its claim directory if another node removed it after the
+        lease expired. Passing times=None makes NFS set the mtime from the server clock.
+        """
+        if not os.path.isdir(self.claim_dir):
+            logger.warning(f"Node '{self.node_id}' lost its lease; re-registering its claim directory.")
+            os.makedirs(self.claim_dir, exist_ok=True)
+        with open(self._heartbeat_path, 'a'):
+            pass
+        os.utime(self._heartbeat_path, None)
+
+    def reclaim_stale(self):
+        """Moves files claimed by nodes whose lease expired back into the input folder. Returns the number requeued."""
+        try:
+            now = os.stat(self._heartbeat_path).st_mtime
+            node_dirs = [entry for entry in os.scandir(self.claims_root) if entry.is_dir() and entry.name != self.node_id]
+        except FileNotFoundError:
+            return 0
+
+        requeued = 0
+        for node_dir in node_dirs:
+            try:
+                last_heartbeat = os.stat(os.path.join(node_dir.path, HEARTBEAT_FILE_NAME)).st_mtime
+            except FileNotFoundError:
+                try:
+                    last_heartbeat = node_dir.stat().st_mtime # Node died before its first heartbeat
+                except FileNotFoundError:
+                    continue # Already cleaned up by another node
+            if now - last_heartbeat <= self.lease_seconds:
+                continue
+
+            logger.warning(f"Lease of node '{node_dir.name}' expired ({now - last_heartbeat:.0f}s since last heartbeat). Reclaiming its files.")
+            requeued += self._requeue_claims(node_dir.path)
+            try:
+                os.remove(os.path.join(node_dir.path, HEARTBEAT_FILE_NAME))
+                os.rmdir(node_dir.path)
+            except OSError:
+                pass # Another node is cleaning up too, or the node came back and claimed something
+        return requeued
+
+    def _requeue_claims(self, claim_dir):
+        requeued = 0
+        for entry in os.scandir(claim_dir):
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            try:
+                # Racing reclaimers: only one rename succeeds, the rest get FileNotFoundError
+                os.rename(entry.path, os.path.join(self.input_dir, entry.name))
+                requeued += 1
+                logger.info(f"Requeued '{entry.name}' from {claim_dir}.")
+            except FileNotFoundError:
+                pass
+        return requeued
+
+    def _run(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+                self.reclaim_stale()
+            except OSError as e:
+                logger.error(f"Claim heartbeat failed for node '{self.node_id}': {e}")
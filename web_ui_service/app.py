@@ -1,17 +1,47 @@
 import os
-from flask import Flask, render_template, jsonify, request # Import request
+import re
+import json
+import uuid
+import sqlite3
+import hashlib
+import tempfile
+import time
+import threading
+from flask import Flask, Request, render_template, jsonify, request # Import request
 import logging
 from datetime import datetime # For unique filenames
 
 app = Flask(__name__)
 
 LOG_DIR = "/app/logs"
-LOG_FILE = os.path.join(LOG_DIR, "recipe_processor.log")
+# Monitor log files: recipe_processor.log, or recipe_processor.<node>.log per node with work claims, plus rotated backups
+LOG_FILE_RE = re.compile(r"^recipe_processor(?:\..+)?\.log(?:\.\d+)?$")
+LOG_TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}") # logging's default asctime
 INPUT_DIR = "/app/input" # Needs to be accessible by Flask for saving uploads
+OUTPUT_DIR = "/app/output" # Monitor output, including its SQLite job index
+JOB_INDEX_DB = os.path.join(OUTPUT_DIR, "jobs.db")
+# Uploads are streamed here first and renamed into INPUT_DIR once complete. Same volume as INPUT_DIR, so the
+# rename is atomic; hidden, so the monitor never looks inside it.
+STAGING_DIR = os.path.join(INPUT_DIR, ".staging")
+UPLOAD_HASHES_DIR = os.path.join(STAGING_DIR, "hashes") # One marker file per accepted upload, named by SHA-256, holding the stored name
+CLAIMS_DIR = os.path.join(INPUT_DIR, ".claims") # Where monitors move files they are working on (work_claims.py)
+UPLOAD_MARKER_GRACE_SECONDS = 60 # A marker this new counts even before its file has been renamed into INPUT_DIR
+UPLOAD_MARKER_PRUNE_SECONDS = 600 # Uploads sweep out markers that are no longer needed at most this often
+ALLOWED_UPLOAD_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pdf') # What the monitor processes
+RETRYABLE_JOB_STATUSES = ("failed", "error") # A file whose jobs all ended like this may be uploaded again
+
+# Pagination limits for the job index endpoints
+DEFAULT_JOBS_PER_PAGE = 50
+MAX_JOBS_PER_PAGE = 200
+JOB_COLUMNS = (
+    "job_id", "source_file", "source_hash", "recipe_name", "status", "message", "created_at", "finished_at",
+    "ocr_seconds", "llm_seconds", "post_process_seconds", "send_seconds", "total_seconds", "output_dir", "artifacts", "token_usage",
+)
 
 # Ensure directories exist (Flask app might also start first)
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(INPUT_DIR, exist_ok=True) # Ensure input dir is created by web_ui as well
+os.makedirs(UPLOAD_HASHES_DIR, exist_ok=True)
 
 app.logger.setLevel(logging.INFO)
 handler = logging.StreamHandler()
@@ -19,17 +49,101 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 app.logger.addHandler(handler)
 
+
+class StagedUpload:
+    """
+    File stream for one uploaded file: written straight into STAGING_DIR chunk by chunk as the request
+    body is parsed, and hashed on the way, so an upload is never held in memory or read twice.
+    """
+    def __init__(self):
+        self.file = tempfile.NamedTemporaryFile(dir=STAGING_DIR, prefix="upload_", delete=False)
+        self.path = self.file.name
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class StagingRequest(Request):
+    """Request whose multipart file parts are streamed into the staging folder (see StagedUpload)."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.staged_uploads = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = StagedUpload()
+        self.staged_uploads.append(stream)
+        return stream
+
+
+app.request_class = StagingRequest
+
+
+@app.teardown_request
+def discard_staged_uploads(exc):
+    # Accepted uploads were renamed away; anything left is rejected, a duplicate or from an aborted request
+    for stream in request.staged_uploads:
+        stream.file.close()
+        try:
+            os.remove(stream.path)
+        except FileNotFoundError:
+            pass
+
+def monitor_log_files():
+    """
+    Returns the monitor's log files and their rotated backups (.1, .2, ...): recipe_processor.log from a single
+    monitor, or recipe_processor.<node>.log from each node when several share the input folder.
+    """
+    if not os.path.isdir(LOG_DIR):
+        return []
+    return sorted(os.path.join(LOG_DIR, f_name) for f_name in os.listdir(LOG_DIR) if LOG_FILE_RE.match(f_name))
+
+
+def read_monitor_logs():
+    """
+    Reads and combines all monitor log files, including rotated backups, into one timeline ordered by the
+    timestamp each entry starts with, so several nodes' logs interleave. Lines without a timestamp (tracebacks)
+    stay with the entry before them. Returns None if there is no log file yet.
+    """
+    log_files = monitor_log_files()
+    if not log_files:
+        return None
+
+    entries = [] # (timestamp, text)
+    for log_path in log_files:
+        try:
+            with open(log_path, 'r', encoding='utf-8') as f:
+                entry = None
+                for line in f:
+                    if not line.endswith("\n"):
+                        line += "\n"
+                    timestamp = LOG_TIMESTAMP_RE.match(line)
+                    if timestamp or entry is None:
+                        entry = [timestamp.group(0) if timestamp else "", line]
+                        entries.append(entry)
+                    else:
+                        entry[1] += line
+        except Exception as e:
+            app.logger.error(f"Error reading log file {log_path}: {e}")
+
+    entries.sort(key=lambda entry: entry[0]) # Stable, so entries with the same timestamp keep their file order
+    return "".join(text for _, text in entries)
+
+
 @app.route('/')
 def index():
     # Initial load of logs
-    log_content = "No log file found yet."
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                log_content = f.read()
-        except Exception as e:
-            app.logger.error(f"Error reading log file for initial load: {e}")
-            log_content = f"Error loading logs: {e}"
+    try:
+        log_content = read_monitor_logs() or "No log file found yet."
+    except Exception as e:
+        app.logger.error(f"Error reading log file for initial load: {e}")
+        log_content = f"Error loading logs: {e}"
     
     log_lines = log_content.splitlines()
     display_logs = [line for line in log_lines if line.strip()]
@@ -39,44 +153,326 @@ def index():
 
 @app.route('/api/logs')
 def get_logs_api():
-    # ... (No change to this function, it's correct) ...
-    # This function reads and combines content from the main log file and all rotated backup files.
-    all_log_files = []
-    
-    # Add the current active log file first
-    if os.path.exists(LOG_FILE):
-        all_log_files.append(LOG_FILE)
-    
-    # Find all rotated log files (e.g., recipe_processor.log.1, recipe_processor.log.2)
-    log_file_base = os.path.basename(LOG_FILE)
-    # Corrected path for os.listdir if LOG_FILE is just a name
-    log_dir_path = os.path.dirname(LOG_FILE) or LOG_DIR 
-    import re # Ensure re is imported if not already globally
-    
-    for f_name in os.listdir(log_dir_path):
-        if re.match(rf"^{re.escape(log_file_base)}\.\d+$", f_name): # Matches "filename.N"
-            full_path = os.path.join(log_dir_path, f_name)
-            all_log_files.append(full_path)
-            
-    # Sort files to ensure chronological order:
-    def sort_key(path):
-        match = re.search(r'\.(\d+)$', path)
-        if match:
-            return int(match.group(1)) # Sort backups by number
-        return -1 # Ensure current log file (-1) comes after all backups (0, 1, 2...)
-
-    all_log_files.sort(key=sort_key) 
-
-    combined_content = []
-    for log_path in all_log_files:
-        if os.path.exists(log_path): 
+    # Combines the log files of every monitor node, including rotated backups (see read_monitor_logs)
+    return jsonify(log_content=read_monitor_logs() or "")
+
+
+def open_job_index():
+    """Opens the monitor's job index read-only. Returns None if the monitor hasn't created it yet."""
+    if not os.path.exists(JOB_INDEX_DB):
+        return None
+    conn = sqlite3.connect(f"file:{JOB_INDEX_DB}?mode=ro", uri=True, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def job_row_to_dict(row):
+    job = dict(row)
+    job["artifacts"] = json.loads(job["artifacts"]) if job["artifacts"] else {}
+    job["token_usage"] = json.loads(job["token_usage"]) if job["token_usage"] else {}
+    return job
+
+
+def job_search_condition(conn, query):
+    """
+    Builds the WHERE condition for a job search: word-prefix matches on source file and recipe name through the
+    jobs_fts full-text index, plus a prefix match on the file hash through its B-tree index.
+
+    Returns:
+        tuple: (sql_condition, params)
+    """
+    words = re.findall(r"\w+", query)
+    hash_prefix = query.lower()
+    subqueries = []
+    params = []
+    if words and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobs_fts'").fetchone():
+        subqueries.append("SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ?")
+        params.append(" ".join(f'"{word}"*' for word in words)) # Every word, each as a prefix
+    elif words:
+        # Index created by an older monitor; jobs_fts appears once the monitor restarts
+        subqueries.append("SELECT id FROM jobs WHERE source_file LIKE ? OR recipe_name LIKE ?")
+        params.extend([f"%{query}%", f"%{query}%"])
+    if re.fullmatch(r"[0-9a-f]{1,64}", hash_prefix):
+        # Range instead of LIKE 'abc%' so idx_jobs_source_hash serves it ('g' sorts after every hex digit)
+        subqueries.append("SELECT id FROM jobs WHERE source_hash >= ? AND source_hash < ?")
+        params.extend([hash_prefix, hash_prefix + "g"])
+    if not subqueries:
+        return "0", []
+    return f"id IN ({' UNION '.join(subqueries)})", params
+
+
+@app.route('/api/jobs')
+def list_jobs_api():
+    """
+    Paginated, searchable listing of processed jobs, newest first.
+    Query params: page (1-based), per_page, q (word prefixes of source file or recipe name, or a hash prefix), status.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', DEFAULT_JOBS_PER_PAGE, type=int), 1), MAX_JOBS_PER_PAGE)
+    query = request.args.get('q', '').strip()
+    status = request.args.get('status', '').strip()
+
+    try:
+        conn = open_job_index()
+        if conn is None:
+            return jsonify(jobs=[], page=page, per_page=per_page, total=0)
+        try:
+            conditions = []
+            params = []
+            if query:
+                search_condition, search_params = job_search_condition(conn, query)
+                conditions.append(search_condition)
+                params.extend(search_params)
+            if status:
+                conditions.append("status = ?")
+                params.append(status)
+            where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+            total = conn.execute(f"SELECT COUNT(*) FROM jobs {where_clause}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where_clause} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (*params, per_page, (page - 1) * per_page)
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        app.logger.error(f"Error querying job index: {e}")
+        return jsonify({"status": "error", "message": f"Failed to query job index: {e}"}), 500
+
+    return jsonify(jobs=[job_row_to_dict(row) for row in rows], page=page, per_page=per_page, total=total)
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job_api(job_id):
+    """Returns a single job, including the parsed createRecipe JSON (post-processed, if it got that far) if it was generated."""
+    try:
+        conn = open_job_index()
+        if conn is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        try:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        app.logger.error(f"Error querying job index for '{job_id}': {e}")
+        return jsonify({"status": "error", "message": f"Failed to query job index: {e}"}), 500
+
+    if row is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    job = job_row_to_dict(row)
+    recipe_path = job["artifacts"].get("processed_recipe") or job["artifacts"].get("create_recipe")
+    job["create_recipe"] = None
+    # Only serve artifacts that live inside the output directory
+    if recipe_path and os.path.realpath(recipe_path).startswith(os.path.realpath(OUTPUT_DIR) + os.sep) and os.path.exists(recipe_path):
+        try:
+            with open(recipe_path, 'r', encoding='utf-8') as f:
+                job["create_recipe"] = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            app.logger.error(f"Error reading {recipe_path} for job '{job_id}': {e}")
+    return jsonify(job)
+
+
+def find_processed_jobs(sha256):
+    """Returns the statuses of jobs in the monitor's index for a file hash (empty if none or no index yet)."""
+    try:
+        conn = open_job_index()
+        if conn is None:
+            return []
+        try:
+            return [row["status"] for row in conn.execute("SELECT status FROM jobs WHERE source_hash = ?", (sha256,))]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        app.logger.error(f"Error checking job index for duplicate upload: {e}")
+        return []
+
+
+def find_indexed_hashes(hashes):
+    """Returns the hashes that have a job in the index that isn't failed, i.e. that the index rejects as duplicates."""
+    indexed = set()
+    conn = open_job_index()
+    if conn is None:
+        return indexed
+    try:
+        for start in range(0, len(hashes), 500): # Stay under SQLite's bound parameter limit
+            chunk = hashes[start:start + 500]
+            rows = conn.execute(
+                f"SELECT DISTINCT source_hash FROM jobs WHERE source_hash IN ({', '.join('?' * len(chunk))}) "
+                f"AND status NOT IN ({', '.join('?' * len(RETRYABLE_JOB_STATUSES))})",
+                (*chunk, *RETRYABLE_JOB_STATUSES)
+            )
+            indexed.update(row["source_hash"] for row in rows)
+    finally:
+        conn.close()
+    return indexed
+
+
+_last_marker_prune = 0.0
+_marker_prune_lock = threading.Lock()
+
+
+def prune_upload_markers():
+    """
+    Removes hash markers that are no longer needed, so UPLOAD_HASHES_DIR doesn't grow with every upload:
+    markers whose hash has a job in the index (which rejects duplicates from then on) and stale markers whose
+    file left INPUT_DIR without being indexed. Runs at most once every UPLOAD_MARKER_PRUNE_SECONDS.
+    """
+    global _last_marker_prune
+    if time.time() - _last_marker_prune < UPLOAD_MARKER_PRUNE_SECONDS or not _marker_prune_lock.acquire(blocking=False):
+        return
+    try:
+        _last_marker_prune = time.time()
+        markers = os.listdir(UPLOAD_HASHES_DIR)
+        indexed = find_indexed_hashes(markers)
+        removed = 0
+        for sha256 in markers:
+            marker_path = os.path.join(UPLOAD_HASHES_DIR, sha256)
+            if sha256 in indexed or not upload_marker_is_live(marker_path):
+                try:
+                    os.remove(marker_path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            app.logger.info(f"Removed {removed} of {len(markers)} upload hash marker(s) that are indexed or stale.")
+    except (OSError, sqlite3.Error) as e:
+        app.logger.error(f"Error pruning upload hash markers: {e}")
+    finally:
+        _marker_prune_lock.release()
+
+
+def upload_marker_is_live(marker_path):
+    """True while the upload recorded in a hash marker is still waiting in INPUT_DIR or claimed by a monitor."""
+    try:
+        if time.time() - os.path.getmtime(marker_path) < UPLOAD_MARKER_GRACE_SECONDS:
+            return True
+        with open(marker_path, 'r', encoding='utf-8') as f:
+            stored_as = f.read().strip()
+    except FileNotFoundError:
+        return False
+    if not stored_as:
+        return False
+    if os.path.exists(os.path.join(INPUT_DIR, stored_as)):
+        return True
+    try:
+        return any(os.path.exists(os.path.join(entry.path, stored_as)) for entry in os.scandir(CLAIMS_DIR) if entry.is_dir())
+    except FileNotFoundError:
+        return False
+
+
+def reserve_upload_hash(sha256, stored_as):
+    """
+    Claims a file hash for a new upload that will be stored as stored_as. Returns None if the file is new,
+    or a message if it's a duplicate.
+
+    The marker is created with O_EXCL, so two requests racing with the same file can't both win. It records the
+    stored name and only counts while that file is still waiting to be processed: once the monitor has archived
+    it, files that were processed (or came in through another route) are found through source_hash in the job
+    index, and an upload that never reached the index can be sent again.
+    """
+    statuses = find_processed_jobs(sha256)
+    if any(status not in RETRYABLE_JOB_STATUSES for status in statuses):
+        return "Already processed"
+    marker_path = os.path.join(UPLOAD_HASHES_DIR, sha256)
+    for _ in range(2):
+        try:
+            marker = os.open(marker_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if statuses:
+                # Uploaded before, but every attempt failed: let it be retried
+                with open(marker_path, 'w', encoding='utf-8') as f:
+                    f.write(stored_as)
+                return None
+            if upload_marker_is_live(marker_path):
+                return "Already uploaded and waiting to be processed"
+            app.logger.info(f"Upload marker {sha256[:12]} is stale (its file is gone and was never indexed). Replacing it.")
             try:
-                with open(log_path, 'r', encoding='utf-8') as f:
-                    combined_content.append(f.read())
-            except Exception as e:
-                app.logger.error(f"Error reading log file {log_path}: {e}")
-    
-    return jsonify(log_content="".join(combined_content))
+                os.remove(marker_path)
+            except FileNotFoundError:
+                pass
+            continue # Re-create with O_EXCL so only one of several racing requests takes the stale marker over
+        with os.fdopen(marker, 'w', encoding='utf-8') as f:
+            f.write(stored_as)
+        return None
+    return "Already uploaded and waiting to be processed"
+
+
+def store_upload(file, prefix):
+    """
+    Moves one streamed upload from the staging folder into INPUT_DIR under a unique name, unless it is a duplicate.
+
+    Returns:
+        dict: filename, status ('accepted', 'duplicate' or 'rejected'), message and, when stored, stored_as and sha256.
+    """
+    stream = file.stream
+    result = {"filename": file.filename}
+    original_name, file_extension = os.path.splitext(file.filename or "")
+    if not file.filename:
+        return {**result, "status": "rejected", "message": "No selected file"}
+    if file_extension.lower() not in ALLOWED_UPLOAD_EXTENSIONS:
+        return {**result, "status": "rejected", "message": f"Unsupported file type '{file_extension}'"}
+    if stream.size == 0:
+        return {**result, "status": "rejected", "message": "Empty file"}
+
+    stream.file.close() # Flushes the last chunk before the rename
+    os.chmod(stream.path, 0o644) # Temporary files are created owner-only; match what file.save() used to produce
+    sha256 = stream.sha256.hexdigest()
+    result["sha256"] = sha256
+
+    # Create a unique filename to avoid conflicts and ensure monitor picks it up
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f") # Add microseconds for more uniqueness
+    # Limit filename length and sanitize
+    safe_filename = "".join(c for c in original_name if c.isalnum() or c in (' ', '.', '_')).rstrip()[:50]
+    unique_filename = f"{prefix}_{safe_filename}_{timestamp}_{uuid.uuid4().hex[:6]}{file_extension}"
+
+    duplicate_message = reserve_upload_hash(sha256, unique_filename)
+    if duplicate_message:
+        app.logger.info(f"Rejected duplicate upload '{file.filename}' ({sha256[:12]}): {duplicate_message}")
+        return {**result, "status": "duplicate", "message": duplicate_message}
+
+    destination_path = os.path.join(INPUT_DIR, unique_filename)
+    try:
+        # Atomic: the monitor sees either nothing or the complete file, never a partial one
+        os.replace(stream.path, destination_path)
+    except OSError:
+        os.remove(os.path.join(UPLOAD_HASHES_DIR, sha256)) # Not stored, so not a duplicate next time
+        raise
+    app.logger.info(f"Received and saved upload '{file.filename}' ({stream.size} bytes) as {destination_path}")
+    return {**result, "status": "accepted", "message": "Uploaded", "stored_as": unique_filename}
+
+
+@app.route('/api/upload', methods=['POST'])
+def upload_files_api():
+    """
+    Accepts any number of files in the 'files' form field. Each file is streamed to disk, hashed and then
+    atomically renamed into the input folder; duplicates of earlier uploads or processed files are rejected.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        app.logger.warning("No 'files' part in upload request.")
+        return jsonify({"status": "error", "message": "No file part"}), 400
+    prune_upload_markers()
+
+    results = []
+    for file in files:
+        try:
+            results.append(store_upload(file, "upload"))
+        except Exception as e:
+            app.logger.error(f"Error saving upload '{file.filename}': {e}")
+            results.append({"filename": file.filename, "status": "error", "message": f"Failed to save file: {e}"})
+
+    accepted = sum(1 for result in results if result["status"] == "accepted")
+    duplicates = sum(1 for result in results if result["status"] == "duplicate")
+    app.logger.info(f"Upload request: {accepted} of {len(results)} file(s) accepted, {duplicates} duplicate(s).")
+    if accepted:
+        status_code = 200
+    elif duplicates == len(results):
+        status_code = 409
+    else:
+        status_code = 400
+    return jsonify(status="success" if accepted == len(results) else "partial" if accepted else "error",
+                   accepted=accepted, duplicates=duplicates, files=results), status_code
 
 
 @app.route('/upload_photo', methods=['POST'])
@@ -89,31 +485,20 @@ def upload_photo():
     if file.filename == '':
         app.logger.warning("No selected file in upload request.")
         return jsonify({"status": "error", "message": "No selected file"}), 400
-    
-    if file:
-        # Create a unique filename to avoid conflicts and ensure monitor picks it up
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f") # Add microseconds for more uniqueness
-        original_filename = file.filename
-        file_extension = os.path.splitext(original_filename)[1]
-        
-        # Limit filename length and sanitize
-        safe_filename = "".join(c for c in os.path.splitext(original_filename)[0] if c.isalnum() or c in (' ', '.', '_')).rstrip()
-        if len(safe_filename) > 50: # Limit base name length
-            safe_filename = safe_filename[:50]
-            
-        unique_filename = f"webcam_recipe_{safe_filename}_{timestamp}{file_extension}"
-        destination_path = os.path.join(INPUT_DIR, unique_filename)
-        
-        try:
-            file.save(destination_path)
-            app.logger.info(f"Received and saved uploaded photo: {destination_path}")
-            # The monitor_service should automatically pick this up
-            return jsonify({"status": "success", "message": "Photo uploaded successfully", "filename": unique_filename}), 200
-        except Exception as e:
-            app.logger.error(f"Error saving uploaded photo {destination_path}: {e}")
-            return jsonify({"status": "error", "message": f"Failed to save photo: {e}"}), 500
-    
-    return jsonify({"status": "error", "message": "Unknown error during upload"}), 500
+    prune_upload_markers()
+
+    try:
+        result = store_upload(file, "webcam_recipe")
+    except Exception as e:
+        app.logger.error(f"Error saving uploaded photo '{file.filename}': {e}")
+        return jsonify({"status": "error", "message": f"Failed to save photo: {e}"}), 500
+
+    if result["status"] == "duplicate":
+        return jsonify({"status": "error", "message": result["message"]}), 409
+    if result["status"] != "accepted":
+        return jsonify({"status": "error", "message": result["message"]}), 400
+    # The monitor_service should automatically pick this up
+    return jsonify({"status": "success", "message": "Photo uploaded successfully", "filename": result["stored_as"]}), 200
 
 
 if __name__ == '__main__':